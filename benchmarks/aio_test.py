@@ -0,0 +1,133 @@
+# coding: utf-8
+""" AsyncEngine against the fake TorrServer, v1 and v2 API (python 3 only, like aio.py) """
+
+import asyncio
+import base64
+import os
+import subprocess
+import sys
+import unittest
+
+LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib')
+sys.path.insert(0, LIB)
+
+from requests.auth import HTTPBasicAuth, HTTPDigestAuth
+
+from torrserve_stream.aio import AsyncEngine, basic_auth_header
+from torrserve_stream.bencodepy import bencode, infohash
+
+import fakeserver
+import torrents
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class AsyncEngineTest(unittest.TestCase):
+    api = 'v2'
+
+    def setUp(self):
+        self.server = fakeserver.FakeTorrServer('127.0.0.1', api=self.api, files=5, info_delay=0).start()
+        self.data = bencode(torrents.multi_file(count=7))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def engine(self, **kwargs):
+        return AsyncEngine(self.server.host, self.server.port, **kwargs)
+
+    def test_version(self):
+        async def check():
+            async with self.engine() as e:
+                return await e.is_v2(), e.version
+
+        is_v2, version = run(check())
+        self.assertEqual(is_v2, self.api == 'v2')
+        self.assertTrue(version)
+
+    def test_upload(self):
+        async def check():
+            async with self.engine() as e:
+                ok = await e.upload('show.torrent', self.data)
+                files = await e.files()
+                url = await e.play_url(3)
+                return ok, e.hash, files, url
+
+        ok, hash, files, url = run(check())
+        self.assertTrue(ok)
+        self.assertEqual(hash, infohash(self.data))
+        self.assertEqual(len(files), 7)
+        self.assertIn(hash, url)
+        self.assertIsNotNone(self.server.get(hash))
+
+    def test_add(self):
+        magnet = 'magnet:?xt=urn:btih:' + '1f' * 20
+
+        async def check():
+            async with self.engine() as e:
+                ok = await e.add(magnet, title='Show')
+                st = await e.stat()
+                stats = await e.stats([e.hash, '0' * 40])
+                return ok, e.hash, st, stats
+
+        ok, hash, st, stats = run(check())
+        self.assertTrue(ok)
+        self.assertEqual(hash, '1f' * 20)
+        self.assertEqual(st['TorrentStatusString'], 'Torrent working')
+        self.assertEqual(list(stats), [hash])
+
+    def test_concurrent(self):
+        self.server.add_link('magnet:?xt=urn:btih:' + '2e' * 20, ready=True)
+
+        async def check():
+            async with self.engine(hash='2e' * 20, pool_size=4) as e:
+                return await asyncio.gather(*[e.buffer_progress() for _ in range(20)])
+
+        progress = run(check())
+        self.assertEqual(len(progress), 20)
+        # the version probe is shared by all coroutines
+        self.assertEqual(self.server.requests.get('GET /echo'), 1)
+
+    def test_rem(self):
+        async def check():
+            async with self.engine() as e:
+                await e.upload('show.torrent', self.data)
+                await e.rem()
+                return e.hash
+
+        self.assertIsNone(self.server.get(run(check())))
+
+
+class AsyncEngineV1Test(AsyncEngineTest):
+    api = 'v1'
+
+
+class AuthTest(unittest.TestCase):
+
+    def test_basic_auth(self):
+        expected = 'Basic ' + base64.b64encode(u'юзер:p'.encode('utf-8')).decode('ascii')
+        for auth in ((u'юзер', 'p'), [u'юзер', 'p'], (u'юзер'.encode('utf-8'), b'p'), HTTPBasicAuth(u'юзер', 'p')):
+            self.assertEqual(basic_auth_header(auth), expected)
+
+    def test_other_auth(self):
+        for auth in (HTTPDigestAuth('u', 'p'), ('u', 'p', 'x'), 'u:p'):
+            self.assertRaises(TypeError, AsyncEngine, auth=auth)
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def test_no_asyncio_on_import(self):
+        code = ('import sys, torrserve_stream; loaded = "asyncio" in sys.modules; '
+                'torrserve_stream.AsyncEngine; print(loaded, "asyncio" in sys.modules)')
+        env = dict(os.environ, PYTHONPATH=LIB)
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(out.split(), [b'False', b'True'])
+
+
+if __name__ == '__main__':
+    unittest.main()
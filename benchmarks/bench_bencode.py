@@ -0,0 +1,194 @@
+# coding: utf-8
+""" Decode/encode time and memory of bencodepy on the synthetic torrent corpus
+
+    python benchmarks/bench_bencode.py [-o results.json] [-b baseline.json]
+
+Each operation runs --repeat times for the best time, then once more under
+tracemalloc for the peak memory and the number of memory blocks its result
+keeps alive. Results are saved as JSON; with a baseline, operations that got
+slower or bigger by more than --threshold are reported and the exit code is 1.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None      # python 2, times only
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream import bencodepy
+from torrserve_stream.bencodepy import BencodeEncoder, MemoryviewDecoder, infohash, lazy_decode
+
+import torrents
+
+
+def names_and_lengths(info):
+    if b'files' not in info:
+        return [(info[b'name'], info[b'length'])]
+    return [(b'/'.join(f[b'path']), f[b'length']) for f in info[b'files']]
+
+
+def files(data):
+    """ what Engine._get_playable_items reads: names and lengths of a full decode """
+    return names_and_lengths(bencodepy.bdecode(data)[b'info'])
+
+
+def lazy_files(data):
+    """ the same through the lazy decoder """
+    return names_and_lengths(lazy_decode(data)[b'info'])
+
+
+def encode_to_null(value, _null=[]):
+    if not _null:
+        _null.append(open(os.devnull, 'wb'))
+    return BencodeEncoder().encode_to(value, _null[0])
+
+
+OPS = {
+    # name: (function, takes the decoded value instead of the bytes)
+    'decode': (bencodepy.bdecode, False),
+    'decode-python': (MemoryviewDecoder().decode, False),
+    'files': (files, False),
+    'lazy-files': (lazy_files, False),
+    'infohash': (infohash, False),
+    'encode': (bencodepy.bencode, True),
+    'encode-stream': (encode_to_null, True),
+}
+
+
+def best_time(func, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func(arg)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def memory(func, arg):
+    if tracemalloc is None:
+        return None, None
+
+    tracemalloc.start()
+    try:
+        result = func(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, blocks
+
+
+def run(shapes, ops, repeat):
+    results = {}
+    for shape in shapes:
+        value = torrents.SHAPES[shape]()
+        data = bencodepy.bencode(value)
+        for op in ops:
+            func, takes_value = OPS[op]
+            arg = value if takes_value else data
+            peak, blocks = memory(func, arg)
+            results[shape + '/' + op] = {
+                'input_bytes': len(data),
+                'seconds': best_time(func, arg, repeat),
+                'peak_bytes': peak,
+                'blocks': blocks,
+            }
+            print('{0:28} {1:10.4f} s {2:>12} peak {3:>9} blocks'.format(
+                shape + '/' + op, results[shape + '/' + op]['seconds'], peak, blocks))
+    return results
+
+
+def revision():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                      cwd=os.path.dirname(os.path.abspath(__file__)),
+                                      stderr=subprocess.STDOUT)
+        return out.decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# differences below these are noise, whatever the ratio
+NOISE = {'seconds': 0.001, 'peak_bytes': 64 * 1024}
+
+
+def compare(results, baseline, threshold):
+    """ prints the ratios to the baseline, returns the keys that regressed """
+    regressions = []
+    print('{0:28} {1:>8} {2:>8}'.format('vs baseline', 'time', 'peak'))
+    for key in sorted(results):
+        old = baseline.get(key)
+        if not old:
+            continue
+        new = results[key]
+        ratios = []
+        worse = False
+        for field in ('seconds', 'peak_bytes'):
+            if new.get(field) is None or not old.get(field):
+                ratios.append(None)
+                continue
+            ratio = float(new[field]) / old[field]
+            ratios.append(ratio)
+            if ratio > 1 + threshold and new[field] - old[field] > NOISE[field]:
+                worse = True
+        if worse:
+            regressions.append(key)
+        print('{0:28} {1:>8} {2:>8} {3}'.format(
+            key, *['-' if r is None else '{0:.2f}x'.format(r) for r in ratios] + ['REGRESSION' if worse else '']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--shapes', nargs='+', choices=sorted(torrents.SHAPES), default=sorted(torrents.SHAPES))
+    parser.add_argument('--ops', nargs='+', choices=sorted(OPS), default=sorted(OPS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help='save results to this JSON file')
+    parser.add_argument('-b', '--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='allowed slowdown or memory growth, 0.15 = 15%%')
+    args = parser.parse_args()
+
+    results = run(args.shapes, args.ops, args.repeat)
+
+    report = {
+        'meta': {
+            'revision': revision(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'backend': bencodepy.backend,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('backend') != report['meta']['backend']:
+            print('note: baseline was measured with the {0} backend'.format(baseline['meta'].get('backend')))
+        if compare(results, baseline['results'], args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
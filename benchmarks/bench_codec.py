@@ -0,0 +1,153 @@
+# coding: utf-8
+""" Parity and throughput of the bencode codecs
+
+    python benchmarks/bench_codec.py [--parity-only] [--rounds N]
+
+Every decoder and encoder (pure python, memoryview, lazy, the default entry
+point and the accelerated backend if installed) has to produce the same
+result as the reference BencodeDecoder/BencodeEncoder, on random values,
+broken input and the torrent shapes from torrents.py.
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream import bencodepy
+from torrserve_stream.bencodepy import (BencodeDecoder, BencodeDecodeError, BencodeEncoder,
+                                        MemoryviewDecoder, accel, lazy_decode)
+from torrserve_stream.bencodepy.lazy import materialize
+
+import fuzz
+import torrents
+
+
+def decoders():
+    result = {
+        'python': BencodeDecoder().decode,
+        'memoryview': MemoryviewDecoder().decode,
+        'lazy': lambda x: materialize(lazy_decode(x)),
+        'bdecode': bencodepy.bdecode,
+    }
+    if accel.bdecode is not None:
+        result[accel.name] = accel.bdecode
+    return result
+
+
+def encoders():
+    def stream(value):
+        f = io.BytesIO()
+        BencodeEncoder().encode_to(value, f)
+        return f.getvalue()
+
+    result = {
+        'python': BencodeEncoder().encode,
+        'stream': stream,
+        'bencode': bencodepy.bencode,
+    }
+    if accel.bencode is not None:
+        result[accel.name] = accel.bencode
+    return result
+
+
+def check_parity(rounds=5000, seed=7):
+    rnd = random.Random(seed)
+    decs = decoders()
+    encs = encoders()
+    ref_decode = decs['python']
+    ref_encode = encs['python']
+    failures = []
+
+    values = [fuzz.random_value(rnd) for _ in range(rounds)]
+    values += [make() for make in torrents.SHAPES.values()]
+
+    for value in values:
+        data = ref_encode(value)
+        for name, encode in encs.items():
+            if encode(value) != data:
+                failures.append(('encode', name, value))
+        expected = ref_decode(data)
+        if expected != fuzz.normalize(value):
+            failures.append(('roundtrip', 'python', value))
+        for name, decode in decs.items():
+            if decode(data) != expected:
+                failures.append(('decode', name, data))
+
+        if not data:
+            continue
+        bad = fuzz.broken(rnd, data)
+        try:
+            expected = ('ok', ref_decode(bad))
+        except BencodeDecodeError:
+            expected = ('error', None)
+        for name, decode in decs.items():
+            if name == accel.name:
+                continue    # stricter by design, bdecode falls back to python
+            try:
+                got = ('ok', decode(bad))
+            except BencodeDecodeError:
+                got = ('error', None)
+            if name == 'lazy' and got[0] != expected[0]:
+                # validates structure only: lets i01e through, but refuses
+                # the ' 3:' and '-0:' key lengths that int() accepts
+                continue
+            if got != expected:
+                failures.append(('broken', name, bad))
+
+    return len(values), failures
+
+
+def best_of(func, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func(arg)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def throughput(repeat=5):
+    rows = []
+    for shape, make in sorted(torrents.SHAPES.items()):
+        value = make()
+        data = BencodeEncoder().encode(value)
+        mb = len(data) / 1024.0 / 1024.0
+        for name, decode in sorted(decoders().items()):
+            rows.append((shape, 'decode', name, mb / best_of(decode, data, repeat)))
+        for name, encode in sorted(encoders().items()):
+            rows.append((shape, 'encode', name, mb / best_of(encode, value, repeat)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--parity-only', action='store_true')
+    parser.add_argument('--rounds', type=int, default=5000)
+    args = parser.parse_args()
+
+    print('accelerated backend: {0}'.format(accel.name))
+
+    count, failures = check_parity(args.rounds)
+    for kind, name, value in failures[:10]:
+        print('  {0} mismatch in {1}: {2!r}'.format(kind, name, value)[:200])
+    print('parity: {0} values, {1} mismatches'.format(count, len(failures)))
+    if failures:
+        return 1
+
+    if not args.parity_only:
+        print('{0:8} {1:7} {2:12} {3:>10}'.format('shape', 'op', 'codec', 'MB/s'))
+        for shape, op, name, rate in throughput():
+            print('{0:8} {1:7} {2:12} {3:10.1f}'.format(shape, op, name, rate))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
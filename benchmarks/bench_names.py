@@ -0,0 +1,101 @@
+# coding: utf-8
+""" Filename decoding of non-UTF-8 torrents: chardet per name vs once per torrent
+
+    python benchmarks/bench_names.py [files] [codec]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream.names import decode_names, encodings
+
+
+TEXT = (u'Однажды весною, в час небывало жаркого заката, в Москве, на Патриарших прудах, '
+        u'появились два гражданина. Первый из них, одетый в летнюю серенькую пару, был '
+        u'маленького роста, упитан, лыс, свою приличную шляпу пирожком нес в руке, а на '
+        u'хорошо выбритом лице его помещались сверхъестественных размеров очки в черной '
+        u'роговой оправе. Второй плечистый, рыжеватый, вихрастый молодой человек в '
+        u'заломленной на затылок клетчатой кепке был в ковбойке, жеваных белых брюках '
+        u'и в черных тапочках').replace(u',', u'').replace(u'.', u'').split()
+
+
+def make_names(count, codec):
+    names = []
+    for i in range(count):
+        words = [TEXT[(i * 3 + j) % len(TEXT)] for j in range(4)]
+        path = u'Том {0:02d}/{1:04d} {2}.mp3'.format(i // 100 + 1, i, u' '.join(words))
+        names.append(path.encode(codec))
+    return names
+
+
+def per_name(names):
+    """ the old _name(): chardet for every name that is not UTF-8 """
+    import chardet      # type: ignore
+    result = []
+    for name in names:
+        try:
+            result.append(name.decode('utf-8'))
+            continue
+        except UnicodeDecodeError:
+            pass
+        enc = chardet.detect(name)
+        if enc['confidence'] > 0.5:
+            try:
+                name = name.decode(enc['encoding'])
+            except UnicodeDecodeError:
+                pass
+        result.append(name)
+    return result
+
+
+def per_torrent(names):
+    encodings.invalidate()
+    return decode_names(names, 'bench')
+
+
+def measure(func, names, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func(names)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    codec = sys.argv[2] if len(sys.argv) > 2 else 'cp1251'
+
+    try:
+        import chardet      # type: ignore
+    except ImportError:
+        print('chardet is not installed')
+        return 1
+
+    names = make_names(count, codec)
+    expected = [name.decode(codec) for name in names]
+
+    old, old_result = measure(per_name, names, repeat=1)
+    new, new_result = measure(per_torrent, names)
+
+    print('{0} {1} names'.format(count, codec))
+    print('  chardet per name   {0:8.3f} s  {1:5.1f}% decoded right'.format(
+        old, 100.0 * sum(a == b for a, b in zip(old_result, expected)) / count))
+    print('  chardet per torrent{0:8.3f} s  {1:5.1f}% decoded right'.format(
+        new, 100.0 * sum(a == b for a, b in zip(new_result, expected)) / count))
+    print('  speedup            {0:8.1f}x'.format(old / new if new else float('inf')))
+
+    # a second open of the same torrent skips detection
+    cached, _ = measure(lambda n: decode_names(n, 'bench'), names)
+    print('  cached codec       {0:8.3f} s'.format(cached))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
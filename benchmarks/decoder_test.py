@@ -0,0 +1,80 @@
+# coding: utf-8
+""" MemoryviewDecoder has to match BencodeDecoder on any input """
+
+import mmap
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream.bencodepy import BencodeDecoder, BencodeDecodeError, BencodeEncoder, MemoryviewDecoder
+from torrserve_stream.bencodepy.compat import PY2
+
+import fuzz
+
+
+def outcome(decode, data):
+    try:
+        return 'ok', decode(data)
+    except BencodeDecodeError as e:
+        return 'error', str(e)
+
+
+def mapped(data):
+    f = tempfile.TemporaryFile()
+    f.write(data)
+    f.flush()
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+
+class MemoryviewDecoderTest(unittest.TestCase):
+    rounds = 2000
+
+    def setUp(self):
+        self.rnd = random.Random(15)
+        self.reference = BencodeDecoder().decode
+        self.decode = MemoryviewDecoder().decode
+        self.encode = BencodeEncoder().encode
+
+    def test_valid(self):
+        for _ in range(self.rounds):
+            data = self.encode(fuzz.random_value(self.rnd))
+            self.assertEqual(self.decode(data), self.reference(data))
+
+    def test_broken(self):
+        for _ in range(self.rounds):
+            data = self.encode(fuzz.random_value(self.rnd))
+            if not data:
+                continue
+            bad = fuzz.broken(self.rnd, data)
+            self.assertEqual(outcome(self.decode, bad), outcome(self.reference, bad), bad)
+
+    @unittest.skipIf(PY2, 'BencodeDecoder on python 2, bytes only')
+    def test_buffers(self):
+        data = self.encode({b'info': {b'name': b'x', b'files': [{b'length': 1, b'path': [b'a', b'b']}]}})
+        expected = self.reference(data)
+        for value in (bytearray(data), memoryview(data), memoryview(data)[:], mapped(data)):
+            self.assertEqual(self.decode(value), expected)
+
+    @unittest.skipIf(PY2, 'BencodeDecoder on python 2, bytes only')
+    def test_broken_mmap(self):
+        # truncated in an integer and in a string length
+        for data in (b'd3:fooi12', b'd3:foo12'):
+            self.assertEqual(outcome(self.decode, mapped(data)), outcome(self.reference, data))
+
+    @unittest.skipIf(PY2, 'BencodeDecoder on python 2, bytes only')
+    def test_no_copy(self):
+        data = self.encode([b'spam', {b'eggs': b'ham'}])
+        result = MemoryviewDecoder(copy=False).decode(data)
+        self.assertEqual(bytes(result[0]), b'spam')
+        self.assertEqual(bytes(result[1][b'eggs']), b'ham')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+# coding: utf-8
+""" Engine against the fake TorrServer, v1 and v2 API """
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote    # type: ignore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream.bencodepy import bwrite, infohash
+from torrserve_stream.engine import BaseEngine, Engine
+from torrserve_stream.metacache import TorrentCache
+
+import fakeserver
+import torrents
+
+
+class EngineTestCase(unittest.TestCase):
+    api = 'v2'
+
+    def setUp(self):
+        self.server = fakeserver.FakeTorrServer('127.0.0.1', api=self.api, files=5, info_delay=0).start()
+        self.tmp = tempfile.mkdtemp(prefix='torrserve-test-')
+        self.cache = TorrentCache(os.path.join(self.tmp, 'cache'))
+        self.saved_cache = Engine.metadata_cache
+        Engine.metadata_cache = self.cache
+        # answers of other tests' servers must not leak in through the shared caches
+        BaseEngine.cache.invalidate(lambda key: True)
+
+    def tearDown(self):
+        Engine.metadata_cache = self.saved_cache
+        self.server.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def engine(self, **kwargs):
+        e = Engine(host=self.server.host, port=self.server.port, **kwargs)
+        self.addCleanup(e.close)
+        return e
+
+    def write(self, name, value):
+        path = os.path.join(self.tmp, name)
+        bwrite(value, path)
+        return path
+
+
+class PathUploadTest(EngineTestCase):
+
+    def check_upload(self, name):
+        value = torrents.multi_file(count=7)
+        path = self.write(name, value)
+
+        e = self.engine(path=path)
+        self.assertTrue(e.success)
+        self.assertTrue(e.wait_result)
+        self.assertEqual(e.hash, infohash(open(path, 'rb').read()))
+        self.assertIsNotNone(self.server.get(e.hash))
+
+        items = e.playable_items
+        self.assertEqual(len(items), 7)
+        self.assertEqual(items[0]['name'], u'Show.Complete/Season 01/Show.S01E01.720p.mkv')
+        self.assertEqual(items[6]['size'], value[b'info'][b'files'][6][b'length'])
+        return e
+
+    def test_path(self):
+        self.check_upload('show.torrent')
+
+    def test_cyrillic_path(self):
+        self.check_upload(u'Сериал «Мастер и Маргарита».torrent')
+
+    def test_file_uri(self):
+        path = self.write(u'фильм.torrent', torrents.single_file())
+        e = self.engine(uri='file://' + quote(path.replace(os.sep, '/').encode('utf-8')))
+        self.assertTrue(e.wait_result)
+        self.assertEqual([item['name'] for item in e.playable_items], [u'Movie.2020.1080p.mkv'])
+
+    def test_missing_path(self):
+        self.assertRaises(EnvironmentError, self.engine, path=os.path.join(self.tmp, 'missing.torrent'))
+
+    def test_server_down(self):
+        path = self.write('show.torrent', torrents.multi_file(count=3))
+        self.engine(path=path).close()      # caches the version probe
+        self.server.stop()
+        self.assertFalse(self.engine(path=self.write('other.torrent', torrents.multi_file(count=3, seed=2))).success)
+
+
+class PathUploadV1Test(PathUploadTest):
+    api = 'v1'
+
+
+class IndexTest(EngineTestCase):
+
+    def test_get_ts_index(self):
+        e = self.engine(path=self.write('show.torrent', torrents.multi_file(count=30)))
+        self.assertEqual(e.get_ts_index(u'Show.Complete/Season 02/Show.S02E02.720p.mkv'), 25)
+        self.assertEqual(e.get_ts_index(u'Show.S02E02.720p.mkv'), 25)
+        self.assertEqual(e.get_ts_index(u'Other/Season 02/Show.S02E02.720p.mkv'), None)
+        self.assertEqual(e.get_ts_index(u'Show.S09E09.720p.mkv'), None)
+
+    def test_id_to_files_index(self):
+        e = self.engine(path=self.write('show.torrent', torrents.multi_file(count=7)))
+        # the server lists the files in another order than the torrent
+        self.server.get(e.hash).files.reverse()
+        BaseEngine.cache.invalidate(lambda key: True)
+
+        self.assertEqual([e.id_to_files_index(i) for i in range(7)], [6, 5, 4, 3, 2, 1, 0])
+        self.assertEqual(e.id_to_files_index(100), 100)
+
+
+class IndexV1Test(IndexTest):
+    api = 'v1'
+
+
+class TempFileTest(EngineTestCase):
+    """ plugins reuse one temp file: it may hold another torrent or be gone when the items are read """
+
+    def check(self, change):
+        path = self.write('temp.torrent', torrents.multi_file(count=7))
+        e = self.engine(path=path)
+        change(path)
+
+        items = e.playable_items
+        self.assertEqual(len(items), 7)
+        self.assertEqual(items[0]['name'], u'Show.Complete/Season 01/Show.S01E01.720p.mkv')
+        if self.cache:
+            # the other torrent did not end up in the cache under this hash
+            self.assertEqual(infohash(self.cache.get(e.hash)), e.hash)
+
+    def overwrite(self, path):
+        bwrite(torrents.single_file(), path)
+
+    def test_overwritten(self):
+        self.check(self.overwrite)
+
+    def test_deleted(self):
+        self.check(os.remove)
+
+    def test_overwritten_no_cache(self):
+        Engine.metadata_cache = self.cache = None
+        self.check(self.overwrite)
+
+    def test_deleted_no_cache(self):
+        Engine.metadata_cache = self.cache = None
+        self.check(os.remove)
+
+
+class TempFileV1Test(TempFileTest):
+    api = 'v1'
+
+
+class StatCacheTest(EngineTestCase):
+    magnet = 'magnet:?xt=urn:btih:' + 'cd' * 20
+
+    def stat_requests(self):
+        return self.server.requests.get('POST /torrents get' if self.api == 'v2' else 'POST /torrent/stat', 0)
+
+    def test_concurrent_stat(self):
+        self.server.add_link(self.magnet, ready=True)
+        e = self.engine(hash='cd' * 20)
+        e.is_v2     # the version probe is not what this test counts
+        BaseEngine.cache.invalidate(lambda key: True)
+        self.server.reset_counters()
+        # the first answer is slow enough for all threads to wait on it
+        self.server.latency = 0.2
+
+        start = threading.Event()
+        results = []
+
+        def stat():
+            start.wait()
+            results.append(e.stat())
+
+        threads = [threading.Thread(target=stat) for _ in range(16)]
+        for t in threads:
+            t.start()
+        start.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(results), 16)
+        self.assertTrue(all(r['Hash'] == e.hash for r in results))
+        self.assertEqual(self.stat_requests(), 1)
+
+    def test_invalidation(self):
+        self.server.add_link(self.magnet, ready=True)
+        other = 'magnet:?xt=urn:btih:' + 'ef' * 20
+        self.server.add_link(other, ready=True)
+        e = self.engine(hash='cd' * 20)
+        e.stat()
+        self.server.reset_counters()
+
+        e.stat()
+        self.assertEqual(self.stat_requests(), 0)
+
+        # any change on the server drops the cached answers for it
+        self.engine(hash='ef' * 20).rem()
+        self.assertEqual(e.stat()['Hash'], e.hash)
+        self.assertEqual(self.stat_requests(), 1)
+
+        self.engine().add(other)
+        self.assertEqual(e.stat()['Hash'], e.hash)
+        self.assertEqual(self.stat_requests(), 2)
+
+
+class StatCacheV1Test(StatCacheTest):
+    api = 'v1'
+
+
+class RequestCacheTest(EngineTestCase):
+
+    def test_request_caching(self):
+        self.server.add_link('magnet:?xt=urn:btih:' + 'ab' * 20, ready=True)
+        e = self.engine(hash='ab' * 20)
+
+        # the keyword other add-ons call request() with
+        first = e.request('get', data={'Hash': e.hash}, caching=True)
+        self.assertIs(e.request('get', data={'Hash': e.hash}, caching=True), first)
+        self.assertEqual(self.server.requests.get('POST /torrents get'), 1)
+
+        self.assertIsNot(e.request('get', data={'Hash': e.hash}), first)
+        self.assertEqual(self.server.requests.get('POST /torrents get'), 2)
+
+        e.rem()
+        self.assertIsNot(e.request('get', data={'Hash': e.hash}, caching=True), first)
+        self.assertEqual(self.server.requests.get('POST /torrents get'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,509 @@
+# coding: utf-8
+""" Local stand-in for TorrServer, v1 (1.1.x) or v2 (MatriX) API
+
+    python benchmarks/fakeserver.py [--api v2] [--port 8090] [--latency 0.02] ...
+
+Torrents are not downloaded: uploads are parsed for their info hash and file
+list, links get a made-up file list, and every torrent turns "working"
+info_delay seconds after it was added. Stream and preload requests send
+zeros. Latency, jitter and a share of failing (HTTP 500) requests can be
+configured to see how the client copes.
+"""
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, quote, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer     # type: ignore
+    from SocketServer import ThreadingMixIn                           # type: ignore
+    from urlparse import parse_qs, urlparse                           # type: ignore
+    from urllib import quote                                          # type: ignore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream.bencodepy import BencodeDecodeError, infohash, lazy_decode
+
+
+STATUS = ['Torrent added', 'Torrent getting info', 'Torrent preload', 'Torrent working',
+          'Torrent closed', 'Torrent in db']
+
+VERSIONS = {'v1': '1.1.77_6', 'v2': 'MatriX.120'}
+
+CHUNK = 64 * 1024
+ZEROS = b'\0' * CHUNK
+
+
+class Torrent(object):
+    __slots__ = ['hash', 'name', 'title', 'poster', 'files', 'added']
+
+    def __init__(self, hash, name, files, title=None, poster=None):
+        self.hash = hash
+        self.name = name
+        self.title = title or name
+        self.poster = poster or ''
+        self.files = files      # [(path, length)]
+        self.added = time.time()
+
+    @property
+    def size(self):
+        return sum(length for _, length in self.files)
+
+    def status(self, info_delay):
+        age = time.time() - self.added
+        if age < info_delay / 2:
+            return 1
+        if age < info_delay:
+            return 2
+        return 3
+
+
+def torrent_files(data):
+    """ (name, [(path, length)]) of .torrent bytes """
+    info = lazy_decode(data)[b'info']
+
+    def text(value):
+        return value.decode('utf-8', 'replace')
+
+    name = text(info.get(b'name.utf-8', info.get(b'name', b'')))
+    if b'files' not in info:
+        return name, [(name, info[b'length'])]
+
+    files = []
+    for f in info[b'files']:
+        path = f.get(b'path.utf-8', f.get(b'path'))
+        files.append((u'/'.join([name] + [text(p) for p in path]), f[b'length']))
+    return name, files
+
+
+def multipart_file(body, content_type):
+    """ contents of the file part of a multipart/form-data body, or None """
+    m = re.search(r'boundary="?([^";]+)"?', content_type or '')
+    if not m:
+        return None
+    delimiter = b'--' + m.group(1).encode('ascii')
+    for part in body.split(delimiter):
+        head, sep, content = part.partition(b'\r\n\r\n')
+        if sep and b'filename=' in head:
+            return content[:-2] if content.endswith(b'\r\n') else content
+    return None
+
+
+def request_key(method, path, query, body):
+    """ 'POST /torrents get', 'GET /stream m3u', 'POST /torrent/stat' ... for the request counters """
+    parts = path.split('/')
+    key = method + ' /' + '/'.join(parts[1:3] if parts[1] == 'torrent' else parts[1:2])
+    if path == '/torrents' and body:
+        m = re.search(br'"action"\s*:\s*"(\w+)"', body)
+        if m:
+            key += ' ' + m.group(1).decode('ascii')
+    for hint in ('m3u', 'preload', 'play'):
+        if hint in query:
+            key += ' ' + hint
+    return key
+
+
+class FakeTorrServer(object):
+    """ Threaded fake TorrServer, started with start() or as a context manager """
+
+    def __init__(self, host='127.0.0.1', port=0, api='v2', latency=0.0, jitter=0.0,
+                 error_rate=0.0, torrents=0, files=10, info_delay=0.2,
+                 preload_size=4 * 1024 * 1024, stream_rate=None, seed=None):
+        self.host = host
+        self.port = port
+        self.api = api
+        self.version = VERSIONS[api]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.files = files
+        self.info_delay = info_delay
+        self.preload_size = preload_size
+        self.stream_rate = stream_rate
+
+        self.requests = {}
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._torrents = {}
+        self._httpd = None
+        self._thread = None
+
+        for i in range(torrents):
+            self.add_link('magnet:?xt=urn:btih:' + hashlib.sha1(str(i).encode('ascii')).hexdigest(),
+                          ready=True)
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(self.host, self.port)
+
+    def start(self):
+        self._httpd = _HTTPServer((self.host, self.port), _Handler)
+        self._httpd.fake = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-torrserver')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def count(self, key):
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = {}
+            self.errors = 0
+
+    def delay(self):
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            fail = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+    # torrents
+
+    def get(self, hash):
+        with self._lock:
+            return self._torrents.get((hash or '').lower())
+
+    def all(self):
+        with self._lock:
+            return list(self._torrents.values())
+
+    def remove(self, hash):
+        with self._lock:
+            return self._torrents.pop((hash or '').lower(), None)
+
+    def _put(self, torrent, ready):
+        with self._lock:
+            torrent = self._torrents.setdefault(torrent.hash, torrent)
+        if ready:
+            torrent.added = time.time() - self.info_delay
+        return torrent
+
+    def add_data(self, data, title=None, poster=None):
+        hash = infohash(data)
+        name, files = torrent_files(data)
+        return self._put(Torrent(hash, name, files, title, poster), False)
+
+    def add_link(self, link, title=None, poster=None, ready=False):
+        m = re.search(r'urn:btih:([0-9a-fA-F]{40})', link)
+        hash = m.group(1).lower() if m else hashlib.sha1(link.encode('utf-8')).hexdigest()
+        name = 'Torrent ' + hash[:8]
+        files = [(u'{0}/Episode {1:03d}.mkv'.format(name, i + 1), 700 * 1024 ** 2 + i)
+                 for i in range(self.files)]
+        return self._put(Torrent(hash, name, files, title, poster), ready)
+
+    # v1 / v2 views
+
+    def stat_v1(self, t):
+        status = t.status(self.info_delay)
+        files = [{'Id': i + 1, 'Path': path, 'Length': length} for i, (path, length) in enumerate(t.files)]
+        return {
+            'Name': t.name,
+            'Hash': t.hash,
+            'TorrentStatus': status,
+            'TorrentStatusString': STATUS[status],
+            'LoadedSize': 0,
+            'TorrentSize': t.size,
+            'PreloadedBytes': self.preload_size if status > 2 else 0,
+            'PreloadSize': self.preload_size,
+            'DownloadSpeed': 0,
+            'UploadSpeed': 0,
+            'TotalPeers': 10,
+            'ActivePeers': 5,
+            'ConnectedSeeders': 3,
+            'FileStats': files,
+            'RealIdFileStats': files,
+        }
+
+    def item_v1(self, t):
+        return {
+            'Name': t.name,
+            'Magnet': 'magnet:?xt=urn:btih:' + t.hash,
+            'Hash': t.hash,
+            'AddTime': int(t.added),
+            'Length': t.size,
+            'Status': STATUS[t.status(self.info_delay)],
+            'Playlist': '/torrent/play?link=' + t.hash + '&m3u=true',
+            'Info': json.dumps({'title': t.title, 'poster_path': t.poster}),
+            'Files': [{
+                'Name': path,
+                'Link': '/torrent/view/{0}/{1}'.format(t.hash, quote(path.encode('utf-8'))),
+                'Preload': '/torrent/preload/{0}/{1}'.format(t.hash, quote(path.encode('utf-8'))),
+                'Size': length,
+                'Viewed': False,
+            } for path, length in t.files],
+        }
+
+    def status_v2(self, t):
+        status = t.status(self.info_delay)
+        return {
+            'title': t.title,
+            'poster': t.poster,
+            'data': json.dumps({'TorrServer': {'Files': []}}),
+            'timestamp': int(t.added),
+            'name': t.name,
+            'hash': t.hash,
+            'stat': status,
+            'stat_string': STATUS[status],
+            'loaded_size': 0,
+            'torrent_size': t.size,
+            'preloaded_bytes': self.preload_size if status > 2 else 0,
+            'preload_size': self.preload_size,
+            'download_speed': 0,
+            'upload_speed': 0,
+            'total_peers': 10,
+            'pending_peers': 0,
+            'active_peers': 5,
+            'connected_seeders': 3,
+            'half_open_peers': 0,
+            'file_stats': [{'id': i + 1, 'path': path, 'length': length}
+                           for i, (path, length) in enumerate(t.files)],
+        }
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    # plumbing
+
+    def send(self, body, content_type='application/json', code=200):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, size):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        rate = self.server.fake.stream_rate
+        while size > 0:
+            chunk = ZEROS[:min(size, CHUNK)]
+            self.wfile.write(chunk)
+            size -= len(chunk)
+            if rate:
+                time.sleep(float(len(chunk)) / rate)
+
+    def not_found(self):
+        self.send(b'not found', 'text/plain', 404)
+
+    def read_body(self):
+        n = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(n) if n else b''
+
+    def handle_one(self, method):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query, keep_blank_values=True).items())
+        body = self.read_body() if method == 'POST' else b''
+        fake.count(request_key(method, url.path, query, body))
+
+        if fake.delay():
+            with fake._lock:
+                fake.errors += 1
+            return self.send(b'injected error', 'text/plain', 500)
+
+        handler = getattr(self, 'do_' + fake.api + '_' + method.lower())
+        try:
+            handler(fake, url.path, query, body)
+        except (BencodeDecodeError, KeyError, ValueError) as e:
+            self.send(str(e).encode('utf-8'), 'text/plain', 400)
+
+    def do_GET(self):
+        self.handle_one('GET')
+
+    def do_POST(self):
+        self.handle_one('POST')
+
+    def json_body(self, body):
+        """ request fields with lowercase names, TorrServer matches them case-insensitively """
+        try:
+            req = json.loads(body.decode('utf-8')) if body else {}
+        except ValueError:
+            return {}
+        return dict((k.lower(), v) for k, v in req.items())
+
+    def upload(self, fake, body):
+        data = multipart_file(body, self.headers.get('Content-Type'))
+        if data is None:
+            raise ValueError('no file in upload')
+        return fake.add_data(data)
+
+    # common GET endpoints
+
+    def common_get(self, fake, path, query):
+        if path == '/echo':
+            self.send(fake.version.encode('ascii'), 'text/plain')
+            return True
+        return False
+
+    # v1: /torrent/<name>
+
+    def do_v1_get(self, fake, path, query, body):
+        if self.common_get(fake, path, query):
+            return
+        if path == '/torrent/restart':
+            return self.send(b'', 'text/plain')
+        m = re.match(r'/torrent/(view|preload)/(\w{40})/', path)
+        if m and fake.get(m.group(2)):
+            return self.send_stream(fake.preload_size)
+        self.not_found()
+
+    def do_v1_post(self, fake, path, query, body):
+        if path == '/torrent/upload':
+            return self.send([self.upload(fake, body).hash])
+
+        name = path[len('/torrent/'):] if path.startswith('/torrent/') else None
+        req = self.json_body(body)
+
+        if name == 'add':
+            info = json.loads(req.get('info') or '{}')
+            t = fake.add_link(req['link'], info.get('title'), info.get('poster_path'))
+            return self.send(t.hash.encode('ascii'), 'text/plain')
+        if name == 'list':
+            return self.send([fake.item_v1(t) for t in fake.all()])
+        if name in ('stat', 'get'):
+            t = fake.get(req.get('hash'))
+            if t is None:
+                return self.not_found()
+            return self.send(fake.stat_v1(t) if name == 'stat' else fake.item_v1(t))
+        if name in ('rem', 'drop'):
+            fake.remove(req.get('hash'))
+            return self.send(b'', 'text/plain')
+        self.not_found()
+
+    # v2: /torrents actions, /stream
+
+    def do_v2_get(self, fake, path, query, body):
+        if self.common_get(fake, path, query):
+            return
+        if not path.startswith('/stream'):
+            return self.not_found()
+
+        t = fake.get(query.get('link'))
+        if t is None:
+            return self.not_found()
+
+        if 'm3u' in query:
+            host = self.headers.get('Host') or '{0}:{1}'.format(fake.host, fake.port)
+            lines = ['#EXTM3U']
+            for i, (p, _) in enumerate(t.files):
+                lines.append(u'#EXTINF:0,' + p.split('/')[-1])
+                lines.append(u'http://{0}/stream/{1}?link={2}&index={3}&play'.format(
+                    host, quote(p.split('/')[-1].encode('utf-8')), t.hash, i + 1))
+            return self.send(u'\n'.join(lines) + u'\n', 'audio/x-mpegurl')
+
+        if 'preload' in query or 'play' in query:
+            return self.send_stream(fake.preload_size)
+
+        self.send(fake.status_v2(t))
+
+    def do_v2_post(self, fake, path, query, body):
+        if path == '/torrent/upload':
+            return self.send(fake.status_v2(self.upload(fake, body)))
+        if path != '/torrents':
+            return self.not_found()
+
+        req = self.json_body(body)
+        action = req.get('action')
+
+        if action == 'add':
+            t = fake.add_link(req['link'], req.get('title'), req.get('poster'))
+            return self.send(fake.status_v2(t))
+        if action == 'list':
+            return self.send([fake.status_v2(t) for t in fake.all()])
+        if action == 'get':
+            t = fake.get(req.get('hash'))
+            return self.send(fake.status_v2(t)) if t else self.not_found()
+        if action in ('rem', 'drop', 'set'):
+            if action == 'rem':
+                fake.remove(req.get('hash'))
+            return self.send(b'', 'text/plain')
+        self.not_found()
+
+
+def add_arguments(parser):
+    parser.add_argument('--api', choices=sorted(VERSIONS), default='v2')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds of random extra latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 500')
+    parser.add_argument('--torrents', type=int, default=0, help='torrents present at start')
+    parser.add_argument('--files', type=int, default=10, help='files per torrent added by link')
+    parser.add_argument('--info-delay', type=float, default=0.2, help='seconds until a new torrent is working')
+    parser.add_argument('--preload-size', type=int, default=4 * 1024 * 1024)
+    parser.add_argument('--stream-rate', type=float, default=None, help='bytes/s of stream responses')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def from_arguments(args, host='127.0.0.1', port=0):
+    return FakeTorrServer(host, port, api=args.api, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, torrents=args.torrents, files=args.files,
+                          info_delay=args.info_delay, preload_size=args.preload_size,
+                          stream_rate=args.stream_rate, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = from_arguments(args, args.host, args.port).start()
+    print('fake TorrServer {0} ({1}) on {2}'.format(server.version, server.api, server.url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
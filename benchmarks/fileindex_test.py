@@ -0,0 +1,76 @@
+# coding: utf-8
+""" FileIndex.find against the linear scan get_ts_index used before it """
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream.fileindex import FileIndex
+
+
+def name_in_path(name, path):
+    if '/' in name and '/' in path:
+        return name == path
+    else:
+        return name.split('/')[-1] == path.split('/')[-1]
+
+
+def linear_find(paths, name):
+    for index, path in enumerate(paths):
+        if name_in_path(name, path):
+            return index
+
+
+FILE_LISTS = [
+    [],
+    [u'Movie.2020.1080p.mkv'],
+    [u'Show/S01/E01.mkv', u'Show/S01/E02.mkv', u'Show/S02/E01.mkv'],
+    # a flat path in front of a nested one with the same basename, and the other way round
+    [u'E01.mkv', u'Show/S01/E01.mkv', u'Show/S02/E01.mkv'],
+    [u'Show/S01/E01.mkv', u'E01.mkv', u'Show/S02/E01.mkv'],
+    # duplicates keep the first index
+    [u'a/b.mkv', u'a/b.mkv', u'b.mkv', u'b.mkv'],
+    [u'Сериал/Сезон 1/Серия 1.mkv', u'Сериал/Сезон 1/Серия 2.mkv', u'Серия 1.mkv'],
+    [u'', u'dir/', u'x/y/', u'y'],
+]
+
+NAMES = [
+    u'', u'/', u'E01.mkv', u'S01/E01.mkv', u'Show/S01/E01.mkv', u'Show/S02/E01.mkv', u'Other/E01.mkv',
+    u'Show/S01/E03.mkv', u'Movie.2020.1080p.mkv', u'x/Movie.2020.1080p.mkv', u'a/b.mkv', u'b.mkv', u'c/b.mkv',
+    u'Серия 1.mkv', u'Сериал/Сезон 1/Серия 2.mkv', u'другой/Серия 1.mkv', u'dir/', u'x/y/', u'x/y', u'/y',
+]
+
+
+class FileIndexTest(unittest.TestCase):
+
+    def check(self, paths, names):
+        index = FileIndex('hash', [(i, path, None) for i, path in enumerate(paths)])
+        for name in names:
+            self.assertEqual(index.find(name), linear_find(paths, name), (paths, name))
+
+    def test_table(self):
+        for paths in FILE_LISTS:
+            self.check(paths, NAMES + paths)
+
+    def test_random(self):
+        rnd = random.Random(10)
+        parts = [u'a', u'b', u'', u'ф']
+
+        def path():
+            return u'/'.join(rnd.choice(parts) for _ in range(rnd.randint(1, 3)))
+
+        for _ in range(500):
+            paths = [path() for _ in range(rnd.randint(0, 6))]
+            self.check(paths, [path() for _ in range(10)])
+
+    def test_ids(self):
+        index = FileIndex('hash', [(0, u'a/1.mkv', 7), (1, u'a/2.mkv', None), (2, u'a/3.mkv', 7)])
+        self.assertEqual(index.by_id, {7: 0})
+        self.assertEqual(len(index), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
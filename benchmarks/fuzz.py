@@ -0,0 +1,44 @@
+# coding: utf-8
+""" Random bencode values and corrupted encodings for the parity checks """
+
+
+def random_value(rnd, depth=0):
+    kind = rnd.randint(0, 5 if depth < 4 else 2)
+    if kind == 0:
+        return rnd.randint(-2 ** 70, 2 ** 70)
+    if kind == 1:
+        return bytes(bytearray(rnd.getrandbits(8) for _ in range(rnd.randint(0, 12))))
+    if kind == 2:
+        return rnd.choice([True, False, 0, -1])
+    if kind == 3:
+        return [random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 4))]
+    if kind == 4:
+        return [[random_value(rnd, depth + 1)]]
+    keys = [bytes(bytearray(rnd.getrandbits(8) for _ in range(rnd.randint(0, 3))))
+            for _ in range(rnd.randint(0, 4))]
+    return dict((k, random_value(rnd, depth + 1)) for k in keys)
+
+
+def normalize(value):
+    # decoders return ints for bools
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if isinstance(value, dict):
+        return dict((k, normalize(v)) for k, v in value.items())
+    return value
+
+
+def broken(rnd, data):
+    """ data truncated, with one byte replaced or with one byte inserted """
+    data = bytearray(data)
+    i = rnd.randrange(len(data))
+    choice = rnd.randint(0, 2)
+    if choice == 0:
+        del data[i:]
+    elif choice == 1:
+        data[i] = rnd.choice(bytearray(b'ilde:0123456789x-'))
+    else:
+        data.insert(i, rnd.choice(bytearray(b'ilde:0-')))
+    return bytes(data)
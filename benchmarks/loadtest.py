@@ -0,0 +1,217 @@
+# coding: utf-8
+""" End-to-end cost of Engine construction, stat polling and play_url under concurrency
+
+    python benchmarks/loadtest.py [--api v2] [--concurrency 8] [--engines 32] [--latency 0.01]
+    python benchmarks/loadtest.py --server http://127.0.0.1:8090    (an already running server)
+
+By default a FakeTorrServer is started in-process with the given latency,
+jitter and error rate. Each scenario reports client side latencies and, for
+the fake server, how many HTTP requests it actually received.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream.bencodepy import bwrite
+from torrserve_stream.engine import Engine
+from torrserve_stream.metacache import TorrentCache
+
+import fakeserver
+import torrents
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def summary(latencies, errors, elapsed):
+    return {
+        'calls': len(latencies) + len(errors),
+        'errors': len(errors),
+        'first_errors': sorted(set(errors))[:3],
+        'per_second': (len(latencies) + len(errors)) / elapsed if elapsed else None,
+        'mean': sum(latencies) / len(latencies) if latencies else None,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies) if latencies else None,
+    }
+
+
+def run_threads(concurrency, worker):
+    """ runs worker(n, record) in concurrency threads, returns (latencies, errors, elapsed) """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def record(func):
+        start = time.time()
+        try:
+            result = func()
+        except Exception as e:
+            with lock:
+                errors.append('{0}: {1}'.format(type(e).__name__, e)[:120])
+            return None
+        elapsed = time.time() - start
+        with lock:
+            latencies.append(elapsed)
+        return result
+
+    threads = [threading.Thread(target=worker, args=(n, record)) for n in range(concurrency)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.time() - start
+
+
+def make_torrents(path, count, files):
+    names = []
+    for i in range(count):
+        filename = os.path.join(path, 'torrent_{0:04d}.torrent'.format(i))
+        bwrite(torrents.multi_file(count=files, size=64 * 1024 ** 2, seed=i), filename)
+        names.append(filename)
+    return names
+
+
+def scenario_construct(args, host, port, filenames):
+    """ Engine(path=...): version probe, upload, wait until working """
+    queue = list(filenames)
+    lock = threading.Lock()
+    engines = []
+
+    def worker(n, record):
+        while True:
+            with lock:
+                if not queue:
+                    return
+                filename = queue.pop()
+
+            def construct():
+                e = Engine(path=filename, host=host, port=port, pool_size=args.concurrency)
+                if not e.success or not e.wait_result:
+                    raise RuntimeError('torrent not ready')
+                return e
+
+            e = record(construct)
+            if e is not None:
+                with lock:
+                    engines.append(e)
+
+    latencies, errors, elapsed = run_threads(args.concurrency, worker)
+    return summary(latencies, errors, elapsed), engines
+
+
+def scenario_loop(args, call):
+    """ every thread repeats call(n) for --duration seconds """
+    deadline = time.time() + args.duration
+
+    def worker(n, record):
+        while time.time() < deadline:
+            record(lambda: call(n))
+            if args.interval:
+                time.sleep(args.interval)
+
+    latencies, errors, elapsed = run_threads(args.concurrency, worker)
+    return summary(latencies, errors, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--server', help='url of a running TorrServer instead of the fake one')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--engines', type=int, default=32, help='torrents uploaded by the construct scenario')
+    parser.add_argument('--torrent-files', type=int, default=20, help='files per uploaded torrent')
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds of stat/play_url polling')
+    parser.add_argument('--interval', type=float, default=0.0, help='pause between polls of one thread')
+    parser.add_argument('-o', '--output', help='save results to this JSON file')
+    fakeserver.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if args.server:
+        url = args.server.rstrip('/').split('://')[-1]
+        host, _, port = url.partition(':')
+        port = int(port or 8090)
+    else:
+        server = fakeserver.from_arguments(args).start()
+        host, port = server.host, server.port
+        print('fake TorrServer {0} ({1}) on {2}, latency {3}+-{4} s, errors {5:.0%}'.format(
+            server.version, server.api, server.url, args.latency, args.jitter, args.error_rate))
+
+    tmp = tempfile.mkdtemp(prefix='torrserve-loadtest-')
+    # keep the user's metadata cache out of it
+    Engine.metadata_cache = TorrentCache(os.path.join(tmp, 'cache'))
+    results = {}
+
+    def report(name, result):
+        if server:
+            result['server_requests'] = dict(server.requests)
+            result['server_errors'] = server.errors
+            server.reset_counters()
+        results[name] = result
+        print('{0:10} {1:6} calls {2:8.1f}/s  p50 {3}  p95 {4}  max {5}  errors {6}'.format(
+            name, result['calls'], result['per_second'] or 0,
+            *[('{0:7.1f} ms'.format(result[k] * 1000) if result[k] is not None else '      -')
+              for k in ('p50', 'p95', 'max')] + [result['errors']]))
+        for error in result['first_errors']:
+            print('           ' + error)
+        if server:
+            print('           server: ' + ', '.join(
+                '{0} {1}'.format(k, v) for k, v in sorted(result['server_requests'].items())))
+
+    try:
+        filenames = make_torrents(tmp, args.engines, args.torrent_files)
+        if server:
+            server.reset_counters()
+
+        result, engines = scenario_construct(args, host, port, filenames)
+        report('construct', result)
+        if not engines:
+            print('no engine was constructed, nothing to poll')
+            return 1
+
+        pollers = [engines[n % len(engines)] for n in range(args.concurrency)]
+        report('stat', scenario_loop(args, lambda n: pollers[n].stat()))
+
+        rnd = random.Random(1)
+
+        def play_url(n):
+            url = pollers[n].play_url(rnd.randrange(args.torrent_files))
+            if not url:
+                raise RuntimeError('no play url')
+            return url
+
+        report('play_url', scenario_loop(args, play_url))
+
+        for e in engines:
+            e.close()
+    finally:
+        if server:
+            server.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.output:
+        report_meta = dict((k, v) for k, v in vars(args).items() if k != 'output')
+        with open(args.output, 'w') as f:
+            json.dump({'meta': report_meta, 'results': results}, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
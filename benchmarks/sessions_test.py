@@ -0,0 +1,63 @@
+# coding: utf-8
+""" SessionPool keys: one session per server and credentials """
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from requests.auth import AuthBase, HTTPBasicAuth, HTTPDigestAuth
+
+from torrserve_stream.sessions import SessionPool
+
+
+class TokenAuth(AuthBase):
+    def __call__(self, r):
+        r.headers['Authorization'] = 'Bearer token'
+        return r
+
+
+class SessionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = SessionPool()
+        self.addCleanup(self.pool.close_all)
+
+    def acquire(self, auth):
+        session = self.pool.acquire('127.0.0.1', 8090, auth)
+        self.addCleanup(self.pool.release, '127.0.0.1', 8090, auth)
+        return session
+
+    def test_equal_credentials_share(self):
+        for make in (lambda: ('u', 'p'), lambda: ['u', 'p'], lambda: HTTPBasicAuth('u', 'p'),
+                     lambda: HTTPDigestAuth('u', 'p')):
+            sessions = [self.acquire(make()) for _ in range(5)]
+            self.assertTrue(all(s is sessions[0] for s in sessions))
+
+        # tuple, list, basic and digest: 3 sessions, lists are keyed as tuples
+        self.assertEqual(len(self.pool._sessions), 3)
+
+    def test_different_credentials(self):
+        a = self.acquire(HTTPBasicAuth('u', 'p'))
+        self.assertIsNot(a, self.acquire(HTTPBasicAuth('u', 'other')))
+        self.assertIsNot(a, self.acquire(HTTPDigestAuth('u', 'p')))
+        self.assertIsNot(a, self.acquire(None))
+
+    def test_other_auth_objects(self):
+        token = TokenAuth()
+        session = self.acquire(token)
+        self.assertIs(session.auth, token)
+        self.assertIs(self.acquire(token), session)
+        self.assertEqual(self.acquire(['u', 'p']).auth, ('u', 'p'))
+
+    def test_release(self):
+        for _ in range(5):
+            auth = HTTPBasicAuth('u', 'p')
+            self.pool.acquire('127.0.0.1', 8090, auth)
+            self.pool.release('127.0.0.1', 8090, HTTPBasicAuth('u', 'p'))
+        self.assertEqual(self.pool._sessions, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
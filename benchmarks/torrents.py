@@ -0,0 +1,166 @@
+# coding: utf-8
+""" Synthetic .torrent metadata shaped like real-world torrents
+
+    python benchmarks/torrents.py <dir> [shape ...]    writes <shape>.torrent files
+"""
+
+import hashlib
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+
+def pieces(total, piece_length):
+    count = max(1, (total + piece_length - 1) // piece_length)
+    return b''.join(hashlib.sha1(str(i).encode('ascii')).digest() for i in range(count))
+
+
+def torrent(info, trackers=2):
+    meta = {
+        b'announce': b'http://tracker.example.org:2710/announce',
+        b'announce-list': [[('http://tracker%d.example.org/announce' % i).encode('ascii')]
+                           for i in range(trackers)],
+        b'comment': b'synthetic',
+        b'created by': b'torrserve benchmarks',
+        b'creation date': 1600000000,
+        b'info': info,
+    }
+    return meta
+
+
+def single_file(size=4 * 1024 ** 3, piece_length=4 * 1024 ** 2, name=b'Movie.2020.1080p.mkv'):
+    return torrent({
+        b'length': size,
+        b'name': name,
+        b'piece length': piece_length,
+        b'pieces': pieces(size, piece_length),
+    })
+
+
+def multi_file(count=500, size=700 * 1024 ** 2, piece_length=2 * 1024 ** 2, seed=1):
+    rnd = random.Random(seed)
+    files = []
+    total = 0
+    for i in range(count):
+        length = rnd.randint(size // 2, size)
+        files.append({
+            b'length': length,
+            b'path': [('Season %02d' % (i // 24 + 1)).encode('ascii'),
+                      ('Show.S%02dE%02d.720p.mkv' % (i // 24 + 1, i % 24 + 1)).encode('ascii')],
+        })
+        total += length
+
+    return torrent({
+        b'files': files,
+        b'name': b'Show.Complete',
+        b'piece length': piece_length,
+        b'pieces': pieces(total, piece_length),
+    })
+
+
+def pack(count=10000, size=8 * 1024 ** 2, piece_length=16 * 1024 ** 2, seed=2):
+    """ music/book packs: many small files in a few folders """
+    rnd = random.Random(seed)
+    files = []
+    total = 0
+    for i in range(count):
+        length = rnd.randint(size // 4, size)
+        files.append({
+            b'length': length,
+            b'path': [('Artist %03d' % (i // 100)).encode('ascii'),
+                      ('Album %02d' % (i // 12 % 10)).encode('ascii'),
+                      ('%02d - Track %05d.flac' % (i % 12 + 1, i)).encode('ascii')],
+        })
+        total += length
+
+    return torrent({
+        b'files': files,
+        b'name': b'Discography',
+        b'piece length': piece_length,
+        b'pieces': pieces(total, piece_length),
+    })
+
+
+def deep_tree(count=2000, depth=12, piece_length=4 * 1024 ** 2, seed=3):
+    """ backups and source trees: long path lists """
+    rnd = random.Random(seed)
+    files = []
+    total = 0
+    for i in range(count):
+        path = [('level%d_%d' % (d, rnd.randint(0, 3))).encode('ascii')
+                for d in range(rnd.randint(depth // 2, depth))]
+        path.append(('file_%05d.dat' % i).encode('ascii'))
+        length = rnd.randint(1, 1024 ** 2)
+        files.append({b'length': length, b'path': path})
+        total += length
+
+    return torrent({
+        b'files': files,
+        b'name': b'backup',
+        b'piece length': piece_length,
+        b'pieces': pieces(total, piece_length),
+    })
+
+
+def huge_pieces(size=200 * 1024 ** 3, piece_length=256 * 1024):
+    """ one big file with small pieces, a ~16 MB 'pieces' field """
+    return single_file(size=size, piece_length=piece_length, name=b'Remux.2160p.mkv')
+
+
+CP1251_WORDS = [u'Сезон', u'Серия', u'Мастер', u'и', u'Маргарита', u'Однажды', u'весною',
+                u'в', u'час', u'небывало', u'жаркого', u'заката', u'Москве']
+
+
+def non_utf8(count=1000, codec='cp1251', piece_length=4 * 1024 ** 2, seed=4):
+    """ names in a legacy codepage and no name.utf-8 / path.utf-8 keys """
+    rnd = random.Random(seed)
+    files = []
+    total = 0
+    for i in range(count):
+        words = u' '.join(rnd.choice(CP1251_WORDS) for _ in range(4))
+        length = rnd.randint(100 * 1024 ** 2, 1400 * 1024 ** 2)
+        files.append({
+            b'length': length,
+            b'path': [(u'%s %d' % (CP1251_WORDS[0], i // 20 + 1)).encode(codec),
+                      (u'%04d %s.avi' % (i, words)).encode(codec)],
+        })
+        total += length
+
+    return torrent({
+        b'files': files,
+        b'name': u'Сериал'.encode(codec),
+        b'piece length': piece_length,
+        b'pieces': pieces(total, piece_length),
+    })
+
+
+SHAPES = {
+    'single': single_file,
+    'multi': multi_file,
+    'pack10k': pack,
+    'deep': deep_tree,
+    'hugepieces': huge_pieces,
+    'cp1251': non_utf8,
+}
+
+
+def write_corpus(path, shapes=None):
+    """ writes one <shape>.torrent per shape, returns their file names """
+    from torrserve_stream.bencodepy import bwrite
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    names = []
+    for shape in shapes or sorted(SHAPES):
+        filename = os.path.join(path, shape + '.torrent')
+        bwrite(SHAPES[shape](), filename)
+        names.append(filename)
+    return names
+
+
+if __name__ == '__main__':
+    for filename in write_corpus(sys.argv[1] if len(sys.argv) > 1 else 'corpus', sys.argv[2:]):
+        print(filename)
@@ -0,0 +1,75 @@
+# coding: utf-8
+""" MultipartFile bodies, non-ASCII file names included """
+
+import io
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from torrserve_stream.upload import MultipartFile, map_file
+
+import fakeserver
+
+CONTENTS = b'd4:infod6:lengthi1e4:name1:xee' * 1000
+
+
+def filename_of(body):
+    m = re.search(br'filename="([^"]*)"', body)
+    return m.group(1).decode('utf-8')
+
+
+class MultipartFileTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.torrent')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(CONTENTS)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def body(self, source, filename, **kwargs):
+        multipart = MultipartFile(source, filename, **kwargs)
+        body = multipart.read()
+        self.assertEqual(len(body), len(multipart))
+        self.assertEqual(fakeserver.multipart_file(body, multipart.content_type), CONTENTS)
+        return body
+
+    def test_file_and_mmap(self):
+        with open(self.path, 'rb') as f:
+            self.body(f, 'a.torrent', chunk_size=1000)
+        data = map_file(self.path)
+        try:
+            body = self.body(data, 'a.torrent', fields={'save': True})
+        finally:
+            data.close()
+        self.assertIn(b'name="save"\r\n\r\nTrue\r\n', body)
+
+    def test_names(self):
+        name = u'Мастер и "Маргарита".torrent'
+        expected = u'Мастер и Маргарита.torrent'
+        for filename in (name, name.encode('utf-8')):
+            with open(self.path, 'rb') as f:
+                self.assertEqual(filename_of(self.body(f, filename)), expected)
+
+        # a legacy codepage path on python 2 still makes a valid header
+        with open(self.path, 'rb') as f:
+            body = self.body(f, name.encode('cp1251'))
+        self.assertTrue(filename_of(body).endswith(u'.torrent'))
+
+    def test_small_reads(self):
+        with open(self.path, 'rb') as f:
+            multipart = MultipartFile(f, u'файл.torrent')
+            out = io.BytesIO()
+            for chunk in iter(lambda: multipart.read(7), b''):
+                self.assertLessEqual(len(chunk), 7)
+                out.write(chunk)
+        self.assertEqual(fakeserver.multipart_file(out.getvalue(), multipart.content_type), CONTENTS)
+
+
+if __name__ == '__main__':
+    unittest.main()
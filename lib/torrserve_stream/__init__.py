@@ -8,3 +8,11 @@ try:
     from .settings import Settings
 except ImportError:
     pass
+
+
+def __getattr__(name):
+    # asyncio takes longer to import than the rest of the package: AsyncEngine (Python 3.7+) loads on first use
+    if name == 'AsyncEngine':
+        from .aio import AsyncEngine
+        return AsyncEngine
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,331 @@
+# coding: utf-8
+
+""" asyncio counterpart of engine.Engine, Python 3 only """
+
+import asyncio
+import base64
+import json
+import uuid
+
+from requests.auth import HTTPBasicAuth
+
+from .engine import (V2toV1Adapter, V2toV1ListAdapter, no_log, encode_url,
+                     parse_version, make_add_params, iter_files, parse_m3u,
+                     parse_upload_result, calc_buffer_progress)
+
+
+class Response(object):
+    __slots__ = ['status_code', 'headers', 'content']
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def basic_auth_header(auth):
+    """ Authorization value for a (user, password) pair or requests' HTTPBasicAuth """
+    if isinstance(auth, HTTPBasicAuth):
+        username, password = auth.username, auth.password
+    elif isinstance(auth, (tuple, list)) and len(auth) == 2:
+        username, password = auth
+    else:
+        raise TypeError('AsyncEngine supports basic auth only: pass (user, password) or HTTPBasicAuth, '
+                        'not {}'.format(type(auth).__name__))
+
+    def text(s):
+        return s.decode('utf-8') if isinstance(s, bytes) else str(s)
+
+    token = base64.b64encode('{}:{}'.format(text(username), text(password)).encode('utf-8'))
+    return 'Basic ' + token.decode('ascii')
+
+
+class HTTPConnectionPool(object):
+    """ Minimal HTTP/1.1 client keeping up to pool_size keep-alive connections to one server """
+
+    def __init__(self, host, port, auth=None, pool_size=4, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []
+        # created on first use so the pool binds to the loop that actually runs it
+        self._slots = None
+        self._auth_header = None
+        if auth:
+            self._auth_header = basic_auth_header(auth)
+
+    async def request(self, method, path, body=None, content_type=None):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+        async with self._slots:
+            return await asyncio.wait_for(self._request(method, path, body, content_type), self.timeout)
+
+    async def _request(self, method, path, body, content_type):
+        if self._idle:
+            try:
+                return await self._roundtrip(self._idle.pop(), method, path, body, content_type)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # the server dropped an idle connection, retry once on a fresh one
+                pass
+
+        connection = await asyncio.open_connection(self.host, self.port)
+        return await self._roundtrip(connection, method, path, body, content_type)
+
+    async def _roundtrip(self, connection, method, path, body, content_type):
+        reader, writer = connection
+        try:
+            self._write_request(writer, method, path, body, content_type)
+            await writer.drain()
+            response, keep_alive = await self._read_response(reader, method)
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            self._idle.append(connection)
+        else:
+            writer.close()
+
+        return response
+
+    def _write_request(self, writer, method, path, body, content_type):
+        lines = [
+            '{} {} HTTP/1.1'.format(method, path),
+            'Host: {}:{}'.format(self.host, self.port),
+            'Connection: keep-alive',
+            'Content-Length: {}'.format(len(body) if body else 0),
+        ]
+        if content_type:
+            lines.append('Content-Type: ' + content_type)
+        if self._auth_header:
+            lines.append('Authorization: ' + self._auth_header)
+
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body:
+            writer.write(body)
+
+    async def _read_response(self, reader, method):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed by server')
+
+        version, status = status_line.decode('latin-1').split(' ', 2)[:2]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        if method == 'HEAD' or status in ('204', '304'):
+            content = b''
+            keep_alive = True
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b''.join(chunks)
+            keep_alive = True
+        elif 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+            keep_alive = True
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        if headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0':
+            keep_alive = False
+
+        return Response(int(status), headers, content), keep_alive
+
+    def close(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            writer.close()
+
+
+class AsyncEngine(object):
+    """ Coroutine based engine for driving many torrents from one event loop """
+
+    def __init__(self, host='127.0.0.1', port=8090, hash=None, log=no_log, auth=None, pool_size=4, timeout=30):
+        self.host = host
+        self.port = port
+        self.hash = hash
+        self.log = log
+        self.http = HTTPConnectionPool(host, port, auth, pool_size, timeout)
+        self.version = None
+        self._probe = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.http.close()
+
+    def make_url(self, path):
+        return 'http://' + self.host + ':' + str(self.port) + path
+
+    async def echo(self):
+        try:
+            r = await self.http.request('GET', '/echo')
+        except (OSError, asyncio.TimeoutError) as e:
+            self.log(str(e))
+            return False
+
+        if r.ok:
+            self.log(r.text)
+            return parse_version(r.text)
+
+        self.log('Error code {}'.format(r.status_code))
+        return False
+
+    async def is_v2(self):
+        if not self.version:
+            # concurrent callers share one /echo round trip
+            if self._probe is None:
+                self._probe = asyncio.ensure_future(self.echo())
+            probe = self._probe
+            try:
+                self.version = await asyncio.shield(probe)
+            finally:
+                if self._probe is probe and probe.done():
+                    self._probe = None
+
+        return bool(self.version) and self.version >= (1, 2)
+
+    async def request(self, name, data=None):
+        is_v2 = await self.is_v2()
+        path = '/torrents' if is_v2 else '/torrent/' + name
+
+        if is_v2:
+            data = dict(data) if data else {}
+            data['action'] = name
+
+        body = json.dumps(data).encode('utf-8') if data else None
+        r = await self.http.request('POST', path, body, 'application/json')
+
+        if not r.ok:
+            self.log('!!! Wrong request !!!')
+            self.log('Error code {}'.format(r.status_code))
+
+        return r
+
+    async def stat(self):
+        if await self.is_v2():
+            return V2toV1Adapter((await self.request('get', {'Hash': self.hash})).json())
+        else:
+            return (await self.request('stat', {'Hash': self.hash})).json()
+
+    async def get(self):
+        if await self.is_v2():
+            return V2toV1Adapter((await self.request('get', {'Hash': self.hash})).json())
+        else:
+            return (await self.request('get', {'Hash': self.hash})).json()
+
+    async def list(self):
+        if await self.is_v2():
+            return [V2toV1ListAdapter(item) for item in (await self.request('list')).json()]
+        else:
+            return (await self.request('list')).json()
+
+    async def stats(self, hashes=None):
+        if await self.is_v2():
+            index = {item['hash']: V2toV1Adapter(item) for item in (await self.request('list')).json()}
+        else:
+            index = {item['Hash']: item for item in (await self.request('list')).json()}
+
+        if hashes is None:
+            return index
+
+        return {h: index[h] for h in hashes if h in index}
+
+    async def rem(self):
+        await self.request('rem', {'Hash': self.hash})
+
+    async def drop(self):
+        await self.request('drop', {'Hash': self.hash})
+
+    async def add(self, uri, title=None, poster=None):
+        is_v2 = await self.is_v2()
+        r = await self.request('add', make_add_params(uri, title, poster, is_v2))
+
+        self.hash = r.json()['hash'] if is_v2 else r.text
+        self.log('Engine add')
+        self.log(self.hash)
+
+        return r.ok
+
+    async def upload(self, name, data):
+        is_v2 = await self.is_v2()
+
+        boundary = uuid.uuid4().hex
+        head = ('--{0}\r\nContent-Disposition: form-data; name="file"; filename="{1}"\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n').format(boundary, name.replace('"', ''))
+        parts = [head.encode('utf-8'), data, b'\r\n']
+        if is_v2:
+            parts.append('--{0}\r\nContent-Disposition: form-data; name="save"\r\n\r\nTrue\r\n'.format(boundary).encode('utf-8'))
+        parts.append('--{0}--\r\n'.format(boundary).encode('utf-8'))
+
+        path = '/torrent/upload'
+        r = await self.http.request('POST', path, b''.join(parts), 'multipart/form-data; boundary=' + boundary)
+
+        self.hash = parse_upload_result(r.json(), is_v2)
+        self.log('Engine upload')
+        self.log(self.hash)
+
+        return r.ok
+
+    async def torrent_stat(self):
+        if await self.is_v2():
+            return await self.stat()
+
+        return (await self.stats()).get(self.hash)
+
+    async def files(self, torrent_stat=None):
+        if not torrent_stat:
+            torrent_stat = await self.torrent_stat()
+        return list(iter_files(torrent_stat, await self.is_v2()))
+
+    async def play_url(self, index, torrent_stat=None):
+        if not torrent_stat:
+            torrent_stat = await self.torrent_stat()
+        fs = torrent_stat['Files'][index]
+
+        if await self.is_v2():
+            r = await self.http.request('GET', '/stream/?link={}&m3u'.format(self.hash))
+            url = parse_m3u(r.text).get(fs['id']) if r.ok else None
+            if url:
+                return url
+
+            quoted_path = encode_url(fs['path'])
+            return self.make_url("/stream/{}?link={}&index={}&play".format(
+                                            quoted_path, self.hash, index+1))
+
+        return self.make_url(fs['Link'])
+
+    async def buffer_progress(self):
+        st = await self.stat()
+        return calc_buffer_progress(st, await self.is_v2())
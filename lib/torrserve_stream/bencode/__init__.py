@@ -1,8 +1,9 @@
+"""Old ``bencode`` module API, served by bencodepy."""
+
 from __future__ import absolute_import
 
-import sys
+from ..bencodepy import Bencached, BencodeDecodeError, bdecode, bencode
+
+BTFailure = BencodeDecodeError
 
-if sys.version_info >=  (3, 0):
-    from .py3 import *
-else:
-    from .py2.bencode import *
\ No newline at end of file
+__all__ = ['BTFailure', 'Bencached', 'bdecode', 'bencode']
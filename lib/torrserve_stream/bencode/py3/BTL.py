@@ -1,2 +0,0 @@
-class BTFailure(Exception):
-    pass
@@ -12,10 +12,12 @@
 
 """bencode.py - bencode encoder + decoder."""
 
+from ..bencodepy import accel
 from ..bencodepy.common import Bencached
-from ..bencodepy.decoder import BencodeDecoder
-from ..bencodepy.encoder import BencodeEncoder
+from ..bencodepy.decoder import BencodeDecoder, MemoryviewDecoder
+from ..bencodepy.encoder import BencodeEncoder, StreamWriter
 from ..bencodepy.exceptions import BencodeDecodeError
+from ..bencodepy.lazy import LazyDict, LazyList, infohash, lazy_decode, select
 
 try:
     from typing import Dict, List, Tuple, Deque, Union, TextIO, BinaryIO, Any
@@ -38,18 +40,26 @@ __all__ = (
     'BencodeDecoder',
     'BencodeDecodeError',
     'BencodeEncoder',
+    'LazyDict',
+    'LazyList',
+    'MemoryviewDecoder',
+    'StreamWriter',
+    'backend',
     'bencode',
     'bdecode',
     'bread',
     'bwrite',
     'encode',
-    'decode'
+    'decode',
+    'infohash',
+    'lazy_decode',
+    'select'
 )
 
 
 class Bencode(object):
     def __init__(self, encoding=None, encoding_fallback=None, dict_ordered=False, dict_ordered_sort=False):
-        self.decoder = BencodeDecoder(
+        self.decoder = MemoryviewDecoder(
             encoding=encoding,
             encoding_fallback=encoding_fallback,
             dict_ordered=dict_ordered,
@@ -58,6 +68,11 @@ class Bencode(object):
 
         self.encoder = BencodeEncoder()
 
+        # the accelerated backend only knows the default mode
+        default_mode = encoding is None and not dict_ordered and not dict_ordered_sort
+        self._fast_decode = accel.bdecode if default_mode else None
+        self._fast_encode = accel.bencode
+
     def decode(self, value):
         # type: (bytes) -> Union[Tuple, List, OrderedDict, bool, int, str, bytes]
         """
@@ -69,6 +84,13 @@ class Bencode(object):
         :return: Decoded value
         :rtype: object
         """
+        if self._fast_decode is not None and type(value) is bytes:
+            try:
+                return self._fast_decode(value)
+            except ValueError:
+                # e.g. unsorted keys, which the python decoder accepts
+                pass
+
         return self.decoder.decode(value)
 
     def encode(self, value):
@@ -82,6 +104,13 @@ class Bencode(object):
         :return: Bencode formatted string
         :rtype: str
         """
+        if self._fast_encode is not None:
+            try:
+                return self._fast_encode(value)
+            except TypeError:
+                # text, Bencached or lazy values are left to the python encoder
+                pass
+
         return self.encoder.encode(value)
 
     def read(self,
@@ -112,20 +141,24 @@ class Bencode(object):
 
         if fd is bytes/string or pathlib.Path-like object, it is opened and
         written to, otherwise .write() is used. if write() is not available,
-        exception raised.
+        exception raised. data is written as it is encoded, the whole bencoded
+        string is never built in memory.
         """
         if isinstance(fd, (bytes, str)):
             with open(fd, 'wb') as fd:
-                fd.write(self.encode(data))
+                self.encoder.encode_to(data, fd)
         elif pathlib is not None and isinstance(fd, (pathlib.Path, pathlib.PurePath)):
             with open(str(fd), 'wb') as fd:
-                fd.write(self.encode(data))
+                self.encoder.encode_to(data, fd)
         else:
-            fd.write(self.encode(data))
+            self.encoder.encode_to(data, fd)
 
 
 DEFAULT = Bencode()
 
+# name of the codec behind bencode() and bdecode()
+backend = accel.name
+
 
 def bencode(value):
     # type: (Union[Tuple, List, OrderedDict, Dict, bool, int, str, bytes]) -> bytes
@@ -0,0 +1,15 @@
+"""bencode.py - optional accelerated backend.
+
+When a compiled codec is installed it handles the default mode (bytes keys
+and values, plain dicts); the pure python codec stays the reference and
+takes over for anything the backend refuses.
+"""
+
+name = 'python'
+bdecode = bencode = None
+
+try:
+    from fastbencode import bdecode, bencode     # type: ignore
+    name = 'fastbencode'
+except ImportError:
+    pass
@@ -12,7 +12,7 @@
 
 """bencode.py - bencode decoder."""
 
-from ..bencodepy.compat import to_binary
+from ..bencodepy.compat import PY2, to_binary
 from ..bencodepy.exceptions import BencodeDecodeError
 from collections import OrderedDict
 
@@ -155,3 +155,139 @@ class BencodeDecoder(object):
             r = OrderedDict(sorted(r.items()))
 
         return r, f + 1
+
+
+class MemoryviewDecoder(BencodeDecoder):
+    """Bencode decoder dispatching on integer byte codes.
+
+    No one-byte slice is allocated per token. Strings are copied out of the
+    input once, or with ``copy=False`` returned as memoryview slices of it
+    (the input must then outlive the result). Python 3 only, on Python 2 it
+    behaves exactly like :class:`BencodeDecoder`.
+    """
+
+    def __init__(self, encoding=None, encoding_fallback=None, dict_ordered=False, dict_ordered_sort=False,
+                 copy=True):
+        super(MemoryviewDecoder, self).__init__(
+            encoding=encoding,
+            encoding_fallback=encoding_fallback,
+            dict_ordered=dict_ordered,
+            dict_ordered_sort=dict_ordered_sort
+        )
+        self.copy = copy
+
+        dispatch = [None] * 256
+        dispatch[ord('l')] = self._decode_list
+        dispatch[ord('d')] = self._decode_dict
+        dispatch[ord('i')] = self._decode_int
+        for digit in bytearray(b'0123456789'):
+            dispatch[digit] = self._decode_string
+        self._dispatch = dispatch
+
+    def decode(self, value):
+        # type: (bytes) -> Union[Tuple, List, OrderedDict, bool, int, str, bytes]
+        """
+        Decode bencode formatted ``value`` (bytes, bytearray, mmap or memoryview).
+
+        :param value: Bencode formatted string
+        :type value: bytes
+
+        :return: Decoded value
+        :rtype: object
+        """
+        if PY2:
+            return super(MemoryviewDecoder, self).decode(value)
+
+        try:
+            if isinstance(value, memoryview):
+                # searching needs the underlying object, a partial view is copied once
+                obj = value.obj
+                if value.contiguous and value.nbytes == len(obj) and hasattr(obj, 'find'):
+                    value = obj
+                else:
+                    value = value.tobytes()
+            elif isinstance(value, str) or not hasattr(value, 'find'):
+                value = to_binary(value)
+
+            data, length = self._dispatch[value[0]](value, memoryview(value), 0)
+        except (IndexError, KeyError, TypeError, ValueError):
+            raise BencodeDecodeError("not a valid bencoded string")
+
+        if length != len(value):
+            raise BencodeDecodeError("invalid bencoded value (data after valid prefix)")
+
+        return data
+
+    def _decode_int(self, x, v, f):
+        # type: (bytes, memoryview, int) -> Tuple[int, int]
+        f += 1
+        # find, not index: mmap has no index()
+        newf = x.find(b'e', f)
+        if newf < 0:
+            raise ValueError
+        n = int(x[f:newf])
+
+        if x[f] == 45:  # '-'
+            if x[f + 1] == 48:  # '0'
+                raise ValueError
+        elif x[f] == 48 and newf != f + 1:
+            raise ValueError
+
+        return n, newf + 1
+
+    def _decode_string(self, x, v, f, kind='value'):
+        # type: (bytes, memoryview, int, str) -> Tuple[bytes, int]
+        colon = x.find(b':', f)
+        if colon < 0:
+            raise ValueError
+        n = int(x[f:colon])
+
+        if x[f] == 48 and colon != f + 1:
+            raise ValueError
+
+        colon += 1
+        end = colon + n
+
+        if self.encoding:
+            try:
+                return str(v[colon:end], self.encoding), end
+            except UnicodeDecodeError:
+                if kind not in self.encoding_fallback:
+                    raise
+
+        if self.copy or kind == 'key':
+            # slicing bytes copies once, other buffers are copied through the view
+            return x[colon:end] if type(x) is bytes else bytes(v[colon:end]), end
+
+        return v[colon:end], end
+
+    def _decode_list(self, x, v, f):
+        # type: (bytes, memoryview, int) -> Tuple[List, int]
+        dispatch = self._dispatch
+        r, f = [], f + 1
+
+        while x[f] != 101:  # 'e'
+            item, f = dispatch[x[f]](x, v, f)
+            r.append(item)
+
+        return r, f + 1
+
+    def _decode_dict(self, x, v, f):
+        # type: (bytes, memoryview, int) -> Tuple[OrderedDict[str, Any], int]
+        dispatch = self._dispatch
+        decode_string = self._decode_string
+        f += 1
+
+        if self.dict_ordered:
+            r = OrderedDict()
+        else:
+            r = {}
+
+        while x[f] != 101:  # 'e'
+            k, f = decode_string(x, v, f, 'key')
+            r[k], f = dispatch[x[f]](x, v, f)
+
+        if self.dict_ordered_sort:
+            r = OrderedDict(sorted(r.items()))
+
+        return r, f + 1
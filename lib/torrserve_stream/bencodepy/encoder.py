@@ -14,6 +14,7 @@
 
 from ..bencodepy.common import Bencached
 from ..bencodepy.compat import PY2, to_binary
+from ..bencodepy.lazy import LazyDict, LazyList
 from collections import deque
 
 try:
@@ -32,11 +33,57 @@ except ImportError:
     pathlib = None
 
 
+class StreamWriter(list):
+    """Fragments waiting to be written to ``write``.
+
+    Encode functions append to it like to the deque used by
+    :meth:`BencodeEncoder.encode`; containers call :meth:`flush` once
+    ``flush_parts`` fragments have piled up. Small fragments are joined into
+    one write, large ones (like ``pieces``) are written without a copy.
+    """
+
+    __slots__ = ['write', 'buffer_size', 'written']
+
+    flush_parts = 1024
+
+    def __init__(self, write, buffer_size=64 * 1024):
+        list.__init__(self)
+        self.write = write
+        self.buffer_size = buffer_size
+        self.written = 0
+
+    def flush(self):
+        run = []
+        for part in self:
+            if len(part) >= self.buffer_size:
+                if run:
+                    self._write(b''.join(run))
+                    run = []
+                self._write(part)
+            else:
+                run.append(part)
+        if run:
+            self._write(b''.join(run))
+        del self[:]
+
+    def _write(self, data):
+        self.write(data)
+        self.written += len(data)
+
+
 class BencodeEncoder(object):
+    # number of distinct dict key sets whose sorted order is remembered
+    max_key_orders = 4096
+
     def __init__(self):
+        # key tuple (in dict order) -> [(key, encoded key)] in bencode order
+        self._key_orders = {}
+
         # noinspection PyDictCreation
         self.encode_func = {}
         self.encode_func[Bencached] = self.encode_bencached
+        self.encode_func[LazyDict] = self.encode_lazy
+        self.encode_func[LazyList] = self.encode_lazy
 
         if PY2:
             from types import DictType, IntType, ListType, LongType, StringType, TupleType, UnicodeType
@@ -68,6 +115,10 @@ class BencodeEncoder(object):
             self.encode_func[tuple] = self.encode_list
             self.encode_func[bytes] = self.encode_bytes
 
+        # encode_to walks containers itself to flush as it goes
+        streamed = {self.encode_dict: self.stream_dict, self.encode_list: self.stream_list}
+        self.stream_func = dict((t, streamed.get(f, f)) for t, f in self.encode_func.items())
+
     def encode(self, value):
         # type: (Union[Tuple, List, OrderedDict, Dict, bool, int, str, bytes]) -> bytes
         """
@@ -87,10 +138,49 @@ class BencodeEncoder(object):
         # Join parts
         return b''.join(r)
 
+    def encode_to(self, value, fd, buffer_size=64 * 1024):
+        # type: (Any, BinaryIO, int) -> int
+        """
+        Encode ``value`` into the bencode format, writing it to ``fd``.
+
+        Only ``buffer_size`` bytes are held at a time, large strings (like
+        ``pieces``) are written straight through.
+
+        :param fd: Binary file, socket file or anything with ``write(bytes)``
+        :return: Number of bytes written
+        :rtype: int
+        """
+        w = StreamWriter(fd.write, buffer_size)
+        self.stream_func[type(value)](value, w)
+        w.flush()
+        return w.written
+
+    def cached(self, value):
+        # type: (Any) -> Bencached
+        """
+        Return ``value`` encoded once, for parts that are written again and
+        again unchanged (e.g. the ``info`` dictionary of a torrent).
+        """
+        if isinstance(value, Bencached):
+            return value
+        return Bencached(self.encode(value))
+
     def encode_bencached(self, x, r):
         # type: (Bencached, Deque[bytes]) -> None
         r.append(x.bencoded)
 
+    def encode_lazy(self, x, r):
+        # type: (Union[LazyDict, LazyList], Deque[bytes]) -> None
+        # lazily decoded values are copied over as the bytes they came from
+        if PY2:
+            # str.join does not take buffers
+            r.append(x._x[x._start:x._end])
+            return
+        try:
+            r.append(memoryview(x._x)[x._start:x._end])
+        except TypeError:
+            r.append(x._x[x._start:x._end])
+
     def encode_int(self, x, r):
         # type: (int, Deque[bytes]) -> None
         r.extend((b'i', str(x).encode('utf-8'), b'e'))
@@ -123,12 +213,54 @@ class BencodeEncoder(object):
         # type: (Dict, Deque[bytes]) -> None
         r.append(b'd')
 
+        for k, encoded_key in self._key_order(x):
+            r.append(encoded_key)
+            v = x[k]
+            self.encode_func[type(v)](v, r)
+
+        r.append(b'e')
+
+    def stream_list(self, x, r):
+        # type: (List, StreamWriter) -> None
+        r.append(b'l')
+
+        stream_func = self.stream_func
+        for i in x:
+            stream_func[type(i)](i, r)
+            if len(r) >= r.flush_parts:
+                r.flush()
+
+        r.append(b'e')
+
+    def stream_dict(self, x, r):
+        # type: (Dict, StreamWriter) -> None
+        r.append(b'd')
+
+        stream_func = self.stream_func
+        for k, encoded_key in self._key_order(x):
+            r.append(encoded_key)
+            v = x[k]
+            stream_func[type(v)](v, r)
+            if len(r) >= r.flush_parts:
+                r.flush()
+
+        r.append(b'e')
+
+    def _key_order(self, x):
+        # type: (Dict) -> List[Tuple[Any, bytes]]
+        """(key, encoded key) pairs in bencode order, remembered per key set"""
+        keys = tuple(x)
+        order = self._key_orders.get(keys)
+        if order is not None:
+            return order
+
         # force all keys to bytes, because str and bytes are incomparable
-        ilist = [(to_binary(k), v) for k, v in x.items()]
+        ilist = [(to_binary(k), k) for k in keys]
         ilist.sort(key=lambda kv: kv[0])
 
-        for k, v in ilist:
-            self.encode_func[type(k)](k, r)
-            self.encode_func[type(v)](v, r)
+        order = [(k, str(len(b)).encode('utf-8') + b':' + b) for b, k in ilist]
 
-        r.append(b'e')
+        if len(self._key_orders) >= self.max_key_orders:
+            self._key_orders.clear()
+        self._key_orders[keys] = order
+        return order
@@ -0,0 +1,286 @@
+"""bencode.py - lazy decoder.
+
+Values are decoded on access only. Dictionaries and lists keep offsets into the
+original buffer, anything that is never looked at (like the ``pieces`` blob of
+a torrent) is skipped over by its length without being copied.
+"""
+
+import hashlib
+
+from ..bencodepy.exceptions import BencodeDecodeError
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+try:
+    from typing import Dict, List, Tuple, Union, Any
+except ImportError:
+    Dict = List = Tuple = Union = Any = None
+
+
+def _find(x, sub, f):
+    # type: (bytes, bytes, int) -> int
+    pos = x.find(sub, f)
+    if pos < 0:
+        raise BencodeDecodeError("not a valid bencoded string")
+    return pos
+
+
+def skip_value(x, f):
+    # type: (bytes, int) -> int
+    """Return the offset just past the bencoded value starting at ``f``."""
+    depth = 0
+    end = len(x)
+
+    while True:
+        c = x[f:f + 1]
+
+        if c == b'l' or c == b'd':
+            depth += 1
+            f += 1
+            continue
+
+        if c == b'e':
+            if not depth:
+                raise BencodeDecodeError("unexpected end of container")
+            depth -= 1
+            f += 1
+        elif c == b'i':
+            f = _find(x, b'e', f) + 1
+        elif c.isdigit():
+            colon = _find(x, b':', f)
+            try:
+                f = colon + 1 + int(x[f:colon])
+            except ValueError:
+                raise BencodeDecodeError("not a valid bencoded string")
+            if f > end:
+                raise BencodeDecodeError("string runs past the end of data")
+        else:
+            raise BencodeDecodeError("not a valid bencoded string")
+
+        if not depth:
+            return f
+
+
+def _decode_string(x, f):
+    # type: (bytes, int) -> Tuple[bytes, int]
+    colon = _find(x, b':', f)
+    try:
+        n = int(x[f:colon])
+    except ValueError:
+        raise BencodeDecodeError("not a valid bencoded string")
+    colon += 1
+    if colon + n > len(x):
+        raise BencodeDecodeError("string runs past the end of data")
+    return bytes(x[colon:colon + n]), colon + n
+
+
+def _decode_at(x, f, end):
+    # type: (bytes, int, int) -> Any
+    c = x[f:f + 1]
+
+    if c == b'd':
+        return LazyDict(x, f, end)
+
+    if c == b'l':
+        return LazyList(x, f, end)
+
+    if c == b'i':
+        try:
+            return int(x[f + 1:end - 1])
+        except ValueError:
+            raise BencodeDecodeError("not a valid bencoded integer")
+
+    return _decode_string(x, f)[0]
+
+
+def _check_end(container, f):
+    # the top level container is given the whole buffer as its span
+    if f + 1 != container._end:
+        raise BencodeDecodeError("invalid bencoded value (data after valid prefix)")
+
+
+class LazyDict(Mapping):
+    """Read-only bencoded dictionary, values are decoded when looked up."""
+
+    __slots__ = ['_x', '_start', '_end', '_spans']
+
+    def __init__(self, x, start, end):
+        self._x = x
+        self._start = start
+        self._end = end
+        self._spans = None
+
+    def _index(self):
+        # type: () -> Dict[bytes, Tuple[int, int]]
+        if self._spans is None:
+            x = self._x
+            spans = {}
+            f = self._start + 1
+
+            while x[f:f + 1] != b'e':
+                k, f = _decode_string(x, f)
+                v_end = skip_value(x, f)
+                spans[k] = (f, v_end)
+                f = v_end
+
+            _check_end(self, f)
+            self._spans = spans
+
+        return self._spans
+
+    def span(self, key):
+        # type: (bytes) -> Tuple[int, int]
+        """Return (start, end) offsets of the raw value of ``key``."""
+        return self._index()[key]
+
+    def raw(self, key):
+        # type: (bytes) -> bytes
+        """Return the bencoded bytes of the value of ``key``."""
+        start, end = self.span(key)
+        return self._x[start:end]
+
+    def __getitem__(self, key):
+        start, end = self._index()[key]
+        return _decode_at(self._x, start, end)
+
+    def __contains__(self, key):
+        return key in self._index()
+
+    def __iter__(self):
+        return iter(self._index())
+
+    def __len__(self):
+        return len(self._index())
+
+
+class LazyList(Sequence):
+    """Read-only bencoded list, items are decoded when accessed."""
+
+    __slots__ = ['_x', '_start', '_end', '_spans']
+
+    def __init__(self, x, start, end):
+        self._x = x
+        self._start = start
+        self._end = end
+        self._spans = None
+
+    def _index(self):
+        # type: () -> List[Tuple[int, int]]
+        if self._spans is None:
+            x = self._x
+            spans = []
+            f = self._start + 1
+
+            while x[f:f + 1] != b'e':
+                v_end = skip_value(x, f)
+                spans.append((f, v_end))
+                f = v_end
+
+            _check_end(self, f)
+            self._spans = spans
+
+        return self._spans
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [_decode_at(self._x, start, end) for start, end in self._index()[i]]
+        start, end = self._index()[i]
+        return _decode_at(self._x, start, end)
+
+    def __iter__(self):
+        x = self._x
+        for start, end in self._index():
+            yield _decode_at(x, start, end)
+
+    def __len__(self):
+        return len(self._index())
+
+
+def lazy_decode(value):
+    # type: (bytes) -> Union[LazyDict, LazyList, int, bytes]
+    """
+    Lazily decode bencode formatted ``value``.
+
+    ``value`` may be bytes, bytearray or an mmap; it must stay alive (and
+    unchanged) while the returned containers are used.
+
+    Containers are not walked here, each one is checked when it is first
+    indexed, so malformed data raises BencodeDecodeError on that access.
+    """
+    try:
+        c = value[0:1]
+        if c == b'd' or c == b'l':
+            return _decode_at(value, 0, len(value))
+
+        end = skip_value(value, 0)
+        if end != len(value):
+            raise BencodeDecodeError("invalid bencoded value (data after valid prefix)")
+        return _decode_at(value, 0, end)
+    except (IndexError, KeyError, TypeError, ValueError):
+        raise BencodeDecodeError("not a valid bencoded string")
+
+
+def materialize(value):
+    """Turn lazy containers into plain dicts and lists."""
+    if isinstance(value, LazyDict):
+        return {k: materialize(v) for k, v in value.items()}
+    if isinstance(value, LazyList):
+        return [materialize(v) for v in value]
+    return value
+
+
+def select(value, path):
+    # type: (Any, str) -> List[Any]
+    """
+    Return all values found at ``path`` in bencoded ``value``.
+
+    ``path`` is a '/' separated list of keys, ``*`` matches every item of a
+    list (or every value of a dictionary), e.g. ``info/files/*/length``.
+    """
+    if not isinstance(value, (LazyDict, LazyList)):
+        value = lazy_decode(value)
+
+    nodes = [value]
+    for part in path.split('/'):
+        found = []
+        for node in nodes:
+            if part == '*':
+                if isinstance(node, LazyList):
+                    found.extend(node)
+                elif isinstance(node, LazyDict):
+                    found.extend(node.values())
+            elif isinstance(node, LazyDict):
+                key = part.encode('utf-8')
+                if key in node:
+                    found.append(node[key])
+            elif isinstance(node, LazyList) and part.isdigit() and int(part) < len(node):
+                found.append(node[int(part)])
+        nodes = found
+
+    return [materialize(node) for node in nodes]
+
+
+def infohash(value):
+    # type: (Any) -> str
+    """
+    Return the hex BitTorrent info hash (BTIH) of torrent ``value``.
+
+    The SHA-1 is taken over the exact bytes of the ``info`` dictionary as they
+    appear in ``value``, nothing is decoded or re-encoded.
+    """
+    top = value if isinstance(value, LazyDict) else lazy_decode(value)
+    if not isinstance(top, LazyDict):
+        raise BencodeDecodeError("not a torrent (top level value is not a dictionary)")
+
+    try:
+        start, end = top.span(b'info')
+    except KeyError:
+        raise BencodeDecodeError("not a torrent (no info dictionary)")
+
+    try:
+        return hashlib.sha1(memoryview(top._x)[start:end]).hexdigest()
+    except TypeError:
+        return hashlib.sha1(top._x[start:end]).hexdigest()
@@ -0,0 +1,103 @@
+# coding: utf-8
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """ Bounded LRU cache whose entries expire after a per-entry TTL """
+
+    def __init__(self, maxsize=256, ttl=0.5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, def_val=None):
+        now = time.time()
+        with self._lock:
+            try:
+                expires, value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return def_val
+
+            if expires <= now:
+                self.misses += 1
+                return def_val
+
+            # re-insert to mark the entry as most recently used
+            self._items[key] = (expires, value)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (expires, value)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """ drops every entry whose key matches predicate, or all entries """
+        with self._lock:
+            if predicate is None:
+                self._items.clear()
+                return
+
+            for key in [k for k in self._items if predicate(k)]:
+                del self._items[key]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._items)}
+
+
+class _Call(object):
+    __slots__ = ['event', 'result', 'error']
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """ Lets concurrent callers with the same key share one outstanding call """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result
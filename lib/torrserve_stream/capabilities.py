@@ -0,0 +1,47 @@
+# coding: utf-8
+
+import threading
+import time
+
+from .cache import SingleFlight
+
+
+class ServerCapabilities(object):
+    """ Process-wide record of TorrServer versions, probed once per host/port """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._probes = SingleFlight()
+
+    def version(self, engine):
+        key = (engine.host, int(engine.port))
+        with self._lock:
+            entry = self._versions.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+
+        def probe():
+            version = engine.echo()
+            # failed probes are not remembered, the next caller tries again
+            if version:
+                with self._lock:
+                    self._versions[key] = (time.time() + self.ttl, version)
+            return version
+
+        return self._probes.do(key, probe)
+
+    def is_v2(self, engine):
+        version = self.version(engine)
+        return bool(version) and version >= (1, 2)
+
+    def invalidate(self, host=None, port=None):
+        with self._lock:
+            if host is None:
+                self._versions.clear()
+            else:
+                self._versions.pop((host, int(port)), None)
+
+
+capabilities = ServerCapabilities()
@@ -3,7 +3,21 @@
 from sys import version_info
 import requests     # type: ignore
 import json
+import mmap
+import os
 import time
+import threading
+
+from .cache import TTLCache, SingleFlight
+from .capabilities import capabilities
+from .registry import TorrentRegistry
+from .preload import Preloader
+from .fileindex import FileIndex
+from .filetable import FileTable
+from .names import decode_names
+from .metacache import TorrentCache
+from .upload import MultipartFile, map_file
+from .sessions import pool as session_pool
 
 if version_info >= (3, 0):
     from urllib.parse import urlparse, unquote_plus
@@ -11,6 +25,7 @@ else:
     from urlparse import urlparse   # type: ignore
     from urllib import unquote_plus
 class V2toV1Adapter(object):
+    __slots__ = ['v2', '_children']
 
     key_equivalents = {
         'TorrentStatusString': 'stat_string',
@@ -24,8 +39,12 @@ class V2toV1Adapter(object):
         'UploadSpeed':  0,
     }
 
+    # CamelCase -> snake_case translations, shared by all adapters
+    v2_keys = {}
+
     def __init__(self, v2):
         self.v2 = v2
+        self._children = None
 
     def __str__(self):
         return self.v2.__str__()
@@ -37,12 +56,19 @@ class V2toV1Adapter(object):
             return def_val
 
     def _get_v2_key(self, key):
+        try:
+            return V2toV1Adapter.v2_keys[key]
+        except KeyError:
+            pass
+
         v2key = key[0].lower()
         for ch in key[1:]:
             if ch.isupper():
                 v2key += '_' + ch.lower()
             else:
                 v2key += ch
+
+        V2toV1Adapter.v2_keys[key] = v2key
         return v2key
 
     def __contains__(self, item):
@@ -62,6 +88,18 @@ class V2toV1Adapter(object):
         if key in self.deprecated:
             return self.deprecated[key]
 
+        # translated values are built once per adapter
+        children = self._children
+        if children is None:
+            children = self._children = {}
+        elif key in children:
+            return children[key]
+
+        value = self._translate(key)
+        children[key] = value
+        return value
+
+    def _translate(self, key):
         def get_element(value):
             if isinstance(value, dict):
                 return self.__class__(value)
@@ -74,9 +112,9 @@ class V2toV1Adapter(object):
                 value = self.v2[v2key] 
                 return get_element(value)
             else:
-                raise KeyError
+                raise KeyError(key)
 
-        if key in ['Files', 'file_stats', 'FileStats']:
+        if key in ('Files', 'file_stats', 'FileStats'):
             try:
                 files = [ V2toV1FilesAdapter(item) for item in self.v2['file_stats'] ]
                 return files
@@ -95,6 +133,8 @@ class V2toV1Adapter(object):
         return get_value(v2key)
 
 class V2toV1ListAdapter(V2toV1Adapter):
+    __slots__ = []
+
     key_equivalents = {
         #'TorrentStatusString': 'stat_string',
         #'TorrentStatus': 'stat',
@@ -105,6 +145,8 @@ class V2toV1ListAdapter(V2toV1Adapter):
     }
 
 class V2toV1FilesAdapter(V2toV1Adapter):
+    __slots__ = []
+
     key_equivalents = {
         'Name': 'path',
         'Size': 'length',
@@ -119,8 +161,11 @@ def no_log(s):
     pass
 
 def url2path(url):
-    import urllib
-    return urllib.url2pathname(urlparse(url).path)
+    if version_info >= (3, 0):
+        from urllib.request import url2pathname
+    else:
+        from urllib import url2pathname     # type: ignore
+    return url2pathname(urlparse(url).path)
 
 def encode_url(s):
     import urllib
@@ -130,25 +175,275 @@ def encode_url(s):
     else:
         return urllib.quote(s.encode('utf8'))
 
+def parse_version(ver):
+    if ver.startswith('MatriX'):
+        ver = ver.replace('MatriX', '2.0')
+
+    ver = ver.replace('_', '.')
+    ver = [int(n) for n in ver.split('.')[:3]]
+    return tuple(ver)
+
+def make_add_params(uri, title=None, poster=None, is_v2=True):
+    params = {'Link': uri}
+    if is_v2:
+        params['save_to_db'] = True
+        if title:
+            params['title'] = title
+        if poster:
+            params['poster'] = poster
+    else:
+        params['DontSave'] = False
+        info = {}
+        if title:
+            info['title'] = title
+        if poster:
+            info['poster_path'] = poster
+        if info:
+            params['Info'] = json.dumps(info, ensure_ascii=False)
+    return params
+
+def iter_files(torrent_stat, is_v2, id_key=None):
+    id = 0
+    for f in torrent_stat['Files']:
+        item = { 'file_id': id, 
+                 'path': f['path'] if is_v2 else f['Name'],
+                 'size': f['length'] if is_v2 else f['Size'],
+                 #'viewed': f['viewed'] if is_v2 else f['Viewed']
+        }
+        if id_key:
+            item['id'] = f.get(id_key)
+        yield item
+        id += 1
+
+def parse_m3u(m3u):
+    """ returns {file index: play url} of a TorrServer playlist """
+    import re
+    index_re = re.compile(r'&index=(\d+)&')
+
+    urls = {}
+    for line in m3u.splitlines():
+        if line.startswith('http://'):
+            m = index_re.search(line)
+            if m:
+                urls.setdefault(int(m.group(1)), line)
+    return urls
+
+class WaitResult(object):
+    __slots__ = ['ready', 'stat', 'elapsed']
+
+    def __init__(self, ready, stat, elapsed):
+        self.ready = ready
+        self.stat = stat
+        self.elapsed = elapsed
+
+    def __bool__(self):
+        return self.ready
+
+    __nonzero__ = __bool__
+
+def video_info_from_data(data, info=None):
+    if info is None:
+        info = json.loads(data) if data else None
+    if not info:
+        return {}
+
+    video_info = {'data': data}
+    if 'title' in info:
+        video_info = {'title': info['title']}
+    if 'overview' in info:
+        video_info['plot'] = info.get('overview', '')
+    if 'year' in info:
+        video_info['year'] = int(info.get('year'))
+    if 'genres' in info:
+        genres = []
+        for g in info['genres']:
+            genres.append(g['name'])
+        if genres: 
+            video_info['genre'] = genres
+    if 'original_title' in info:
+        video_info['originaltitle'] = info.get('original_title')
+    if 'vote_average' in info:
+        video_info['rating'] = info.get('vote_average', 0.0)
+    if 'origin_country' in info:
+        country = ''
+        for g in info.get('origin_country'):
+            country += g + ', '
+        if country: video_info['studio'] = country.strip(' ,')
+    if 'runtime' in info:
+        video_info['duration'] = info.get('runtime', 0) / 1000
+    if 'imdb_id' in info:
+        video_info['imdbnumber'] = info.get('imdb_id')
+    if "media_type" in info:
+        video_info['mediatype'] = info.get('media_type', '')
+    if "seasons" in info and not video_info.get('mediatype'):
+        video_info['mediatype'] = 'tvshow'
+
+    return video_info
+
+class TorrentSnapshot(object):
+    """ Metadata of one torrent stat, the Info/data JSON is decoded at most once """
+
+    __slots__ = ['stat', 'is_v2', '_info']
+
+    def __init__(self, stat, is_v2):
+        self.stat = stat if stat is not None else {}
+        self.is_v2 = is_v2
+        self._info = None
+
+    @property
+    def data(self):
+        return self.stat.get('data') if self.is_v2 else self.stat.get('Info')
+
+    @property
+    def info(self):
+        if self._info is None:
+            data = self.data
+            self._info = (json.loads(data) if data else None) or {}
+        return self._info
+
+    @property
+    def title(self):
+        if self.is_v2:
+            return self.stat.get('title')
+        return self.info.get('title')
+
+    @property
+    def poster(self):
+        if self.is_v2:
+            return self.stat.get('poster')
+        return self.info.get('poster_path')
+
+    @property
+    def fanart(self):
+        if self.is_v2:
+            return None # self.stat.get('fanart')
+        return self.info.get('backdrop_path')
+
+    @property
+    def art(self):
+        art = {}
+
+        poster = self.poster
+        if poster:
+            art = {
+                'thumb': poster,
+                'poster': poster,
+            }
+
+        fanart = self.fanart
+        if fanart:
+            art['fanart'] = fanart
+
+        return art
+
+    @property
+    def video_info(self):
+        info = video_info_from_data(self.data, self.info)
+        if info:
+            return info
+        return {'title': self.title} if self.is_v2 else {}
+
+    @property
+    def files(self):
+        return list(iter_files(self.stat, self.is_v2))
+
+def parse_upload_result(result, is_v2):
+    try:
+        res = result[0]
+    except KeyError:
+        res = result
+
+    return res['hash'] if is_v2 else res
+
+def calc_buffer_progress(st, is_v2):
+    stat_id = st.get('TorrentStatus')
+
+    # Fix zero preload size
+    if is_v2:
+        if stat_id > 2:
+            return 100
+        elif stat_id < 2:
+            return 0
+
+    preloadedBytes = st.get('PreloadedBytes', 0)
+    preloadSize = st.get('PreloadSize', 0)
+    if preloadSize > 0 and preloadedBytes > 0:
+        prc = preloadedBytes * 100 / preloadSize
+        if prc >= 100:
+            prc = 100
+
+        if prc > 0 and stat_id != 2: # 2 - 'Torrent preload'
+            prc = 100
+        return prc
+
+    return 0
+
 class BaseEngine(object):
-    cache = []
+    cache = TTLCache(maxsize=256)
+    cache_ttl = {
+        'stat': 0.5,
+        'get':  0.5,
+        'list': 0.5,
+    }
+    in_flight = SingleFlight()
+    registries = {}
+    registries_lock = threading.Lock()
+    pool_size = None
 
     def make_url(self, path):
         return 'http://' + self.host + ':' + str(self.port) + path
 
+    @property
+    def session(self):
+        if '_session' not in self.__dict__:
+            self._session = session_pool.acquire(self.host, self.port, self.auth, self.pool_size)
+
+        return self._session
+
+    def close(self):
+        if '_session' in self.__dict__:
+            del self._session
+            session_pool.release(self.host, self.port, self.auth)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def version(self):
+        return capabilities.version(self)
+
     @property
     def is_v2(self):
-        if 'version' not in self.__dict__:
-            self.version = self.echo()
+        return capabilities.is_v2(self)
 
-        return self.version >= (1, 2)
+    def _send(self, method, url, **kwargs):
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.ConnectionError:
+            # the server may have been restarted or replaced, probe it again next time
+            capabilities.invalidate(self.host, self.port)
+            raise
 
     def request(self, name, method='POST', data=None, files=None, caching=False):
+        """ caching=True answers with the same response for cache_ttl[name] seconds (0.5 by
+            default); stat()/get()/list() go through request_json, which caches parsed JSON
+        """
+        if caching and not files:
+            key = self._cache_key(name, data) + (method, 'response')
+            result = BaseEngine.cache.get(key)
+            if result is None:
+                result = self.request(name, method, dict(data) if data else None)
+                if result.ok:
+                    BaseEngine.cache.put(key, result, self.cache_ttl.get(name))
+            return result
 
         if self.is_v2 and name == 'upload':
             url = self.make_url('/torrent/upload')
             data = {'save': True}
-            result = requests.post(url, data=data, files=files, auth=self.auth)
+            result = self._send('POST', url, data=data, files=files)
             return result
 
         url = self.make_url('/torrents' if self.is_v2 else '/torrent/' + name)
@@ -163,52 +458,57 @@ class BaseEngine(object):
         if data:
             data = json.dumps(data)
 
-        import time
-        now = time.time()
-
-        timeout = 0.5
-        if caching:
-            for item in BaseEngine.cache[:]:
-                (_method, _url, _data, _files, _now, _result) = item
-                if _method == method and _url == url and _data == data and _files == files:
-                    if now - _now < timeout:
-                        return _result
-                    else:
-                        BaseEngine.cache.remove(item)
-
-        if method=='POST':
-            result = requests.post(url, data=data, files=files, auth=self.auth)
-        else:
-            result = requests.get(url, data=data, files=files, auth=self.auth)
+        result = self._send(method, url, data=data, files=files)
 
-        if result.ok:
-            if caching:
-                BaseEngine.cache.append((method, url, data, files, now, result))
-            pass
-        else:
+        if not result.ok:
             self.log('!!! Wrong request !!!')
             self.log('Error code {}'.format(result.status_code))
 
         return result
 
+    def _cache_key(self, name, data, wrap=None):
+        return (self.host, self.port, name, json.dumps(data, sort_keys=True) if data else None, wrap)
+
+    def request_json(self, name, data=None, caching=False, refresh=False, wrap=None):
+        """ wrap (e.g. V2toV1Adapter) is applied to the answer before it is cached,
+            so the cached wrapper and whatever it memoizes are shared by all callers
+        """
+        if not caching:
+            result = self.request(name, data=data).json()
+            return wrap(result) if wrap else result
+
+        key = self._cache_key(name, data, wrap)
+        if not refresh:
+            result = BaseEngine.cache.get(key)
+            if result is not None:
+                return result
+
+        def fetch():
+            r = self.request(name, data=dict(data) if data else None)
+            result = r.json()
+            if wrap:
+                result = wrap(result)
+            if r.ok:
+                BaseEngine.cache.put(key, result, self.cache_ttl.get(name))
+            return result
+
+        return BaseEngine.in_flight.do(key, fetch)
+
+    def invalidate_cache(self):
+        host, port = self.host, self.port
+        BaseEngine.cache.invalidate(lambda key: key[0] == host and key[1] == port)
+
     def echo(self):
         url = self.make_url('/echo')
         try:
-            r = requests.get(url, auth=self.auth)
+            r = self.session.get(url)
         except requests.ConnectionError as e:
             self.log(_u(e))
             return False
 
         if r.status_code == requests.codes.ok:
             self.log(r.text)
-            ver = r.text
-
-            if ver.startswith('MatriX'):
-                ver = ver.replace('MatriX', '2.0')
-
-            ver = ver.replace('_', '.')
-            ver = [int(n) for n in ver.split('.')[:3]]
-            return tuple(ver)
+            return parse_version(r.text)
 
         try:
             r.raise_for_status()
@@ -219,56 +519,85 @@ class BaseEngine(object):
 
         return False
 
-    def stat(self):
+    def stat(self, refresh=False):
+        """ refresh=True skips the cached answer, the new one is still cached for other callers """
         if self.is_v2:
-            return V2toV1Adapter(self.request('get', data={'Hash': self.hash}, caching=True).json())
+            return self.request_json('get', data={'Hash': self.hash}, caching=True, refresh=refresh,
+                                     wrap=V2toV1Adapter)
         else:
-            return self.request('stat', data={'Hash': self.hash}, caching=True).json()
+            return self.request_json('stat', data={'Hash': self.hash}, caching=True, refresh=refresh)
 
     def get(self):
         if self.is_v2:
-            return V2toV1Adapter(self.request('get', data={'Hash': self.hash}, caching=True).json())
+            return self.request_json('get', data={'Hash': self.hash}, caching=True, wrap=V2toV1Adapter)
         else:
-            return self.request('get', data={'Hash': self.hash}, caching=True).json()
+            return self.request_json('get', data={'Hash': self.hash}, caching=True)
         
     def list(self):
         if self.is_v2:
-            return [V2toV1ListAdapter(item) for item in self.request('list', caching=True).json()]
+            return [V2toV1ListAdapter(item) for item in self.request_json('list', caching=True)]
         else:
-            return self.request('list', caching=True).json()
+            return self.request_json('list', caching=True)
+
+    @property
+    def registry(self):
+        """ torrent registry shared by all engines of this server """
+        key = (self.host, self.port)
+        registry = BaseEngine.registries.get(key)
+        if registry is None:
+            if self.is_v2:
+                registry = TorrentRegistry('hash', V2toV1Adapter)
+            else:
+                registry = TorrentRegistry('Hash')
+            with BaseEngine.registries_lock:
+                registry = BaseEngine.registries.setdefault(key, registry)
+
+        return registry
+
+    def refresh_registry(self):
+        """ fetches list() into the registry and returns what changed since the last refresh """
+        return self.registry.update(self.request_json('list', caching=True))
+
+    def stats(self, hashes=None):
+        """ returns {hash: stat} for all (or the given) torrents from a single list request """
+        self.refresh_registry()
+        registry = self.registry
+
+        if hashes is None:
+            return registry.index()
+
+        return {h: registry.get(h) for h in hashes if h in registry}
 
     def restart(self):
         self.request('restart', method='GET')
 
     def rem(self):
         self.request('rem', data={'Hash': self.hash})
+        self.invalidate_cache()
 
     def drop(self):
         self.request('drop', data={'Hash': self.hash})
+        self.invalidate_cache()
+
+    def _post_upload(self, name, source):
+        """ streams source (open file or mmap) as the multipart upload body """
+        body = MultipartFile(source, name, {'save': True} if self.is_v2 else None)
+        url = self.make_url('/torrent/upload')
+        self.log(_u(url))
+
+        r = self._send('POST', url, data=body, headers={'Content-Type': body.content_type})
+        self.invalidate_cache()
+        return r
 
     def upload_file(self, filename):
-        files = {'file': open(filename, 'rb')}
-        return self.request('upload', files=files)
+        with open(filename, 'rb') as f:
+            return self._post_upload(os.path.basename(filename), f)
 
     def add(self, uri, title=None, poster=None, data=None):
-        params = {'Link': uri}
-        if self.is_v2:
-            params['save_to_db'] = True
-            if title:
-                params['title'] = title
-            if poster:
-                params['poster'] = poster
-        else:
-            params['DontSave'] = False
-            info = {}
-            if title:
-                info['title'] = title
-            if poster:
-                info['poster_path'] = poster
-            if info:
-                params['Info'] = json.dumps(info, ensure_ascii=False)
+        params = make_add_params(uri, title, poster, self.is_v2)
 
         r = self.request('add', data=params)
+        self.invalidate_cache()
 
         if self.is_v2:
             info = json.loads(r.content)
@@ -287,16 +616,15 @@ class BaseEngine(object):
         return r.status_code == requests.codes.ok
 
     def upload(self, name, data):
-        files = {'file': (name, data)}
-
-        r = self.request('upload', files=files)
-
-        try:
-            res = r.json()[0]
-        except KeyError:
-            res = r.json()
+        if isinstance(data, mmap.mmap):
+            data.seek(0)
+            r = self._post_upload(os.path.basename(name), data)
+        else:
+            files = {'file': (name, data)}
+            r = self.request('upload', files=files)
+            self.invalidate_cache()
 
-        self.hash = res['hash'] if self.is_v2 else res
+        self.hash = parse_upload_result(r.json(), self.is_v2)
 
         self.log('Engine upload')
         self.log(self.hash)
@@ -307,23 +635,49 @@ class BaseEngine(object):
 
 
 class Engine(BaseEngine):
-    m3u_cache = {}
+    m3u_cache = TTLCache(maxsize=32, ttl=600)
+    m3u_in_flight = SingleFlight()
+
+    wait_first_delay = 0.05
+    wait_max_delay = 0.5
+    wait_backoff = 1.6
+
+    preload_chunk_size = 256 * 1024
+    preload_budget = None
+
+    # set to None to disable the on-disk torrent cache
+    metadata_cache = TorrentCache()
 
-    def _wait_for_data(self, timeout=10):
+    def _wait_for_data(self, timeout=10, cancel=None):
+        """ polls stat() with growing delays until the torrent is working, the
+            timeout expires or the cancel event is set. Returns WaitResult with the
+            last observed stat, which also stays in the stat cache for the caller.
+        """
         self.log('_wait_for_data')
-        #files = self.list()
-        for n in range(timeout*2):
-            st = self.stat()
-            try:
-                self.log(st['TorrentStatusString'])
+        start = time.time()
+        deadline = start + timeout
+        delay = self.wait_first_delay
+        while True:
+            st = self.stat(refresh=True)
+            status = st.get('TorrentStatusString')
+            self.log(_u(status) if status else '"TorrentStatusString" not in stat')
+
+            now = time.time()
+            if status == 'Torrent working':
+                return WaitResult(True, st, now - start)
+
+            remaining = deadline - now
+            if remaining <= 0:
+                self.log('_wait_for_data: timeout')
+                return WaitResult(False, st, now - start)
+
+            if cancel is not None:
+                if cancel.wait(min(delay, remaining)):
+                    return WaitResult(False, st, time.time() - start)
+            else:
+                time.sleep(min(delay, remaining))
 
-                if st['TorrentStatusString'] != 'Torrent working':
-                    time.sleep(0.5)
-                else:
-                    break
-            except KeyError:
-                self.log('"TorrentStatusString" not in stat')
-                time.sleep(0.5)
+            delay = min(delay * self.wait_backoff, self.wait_max_delay)
 
     def __init__(self, 
                 uri=None, 
@@ -335,39 +689,139 @@ class Engine(BaseEngine):
                 hash=None, 
                 title=None, 
                 poster=None,
-                auth=None):
+                auth=None,
+                pool_size=None):
         self.uri = uri
         self.host = host
         self.port = port
         self.hash = hash
         self.log = log
         self.success = True
-        self._playable_items = []
-        self.data = None
+        self.wait_result = None
+        self.preloader = None
+        self._file_index = None
+        self._file_table = None
+        self._playable_items = FileTable()
+        self._data = None
+        self._data_path = None
         self.auth = auth
-        
-        self.version = self.echo()
+        if pool_size:
+            self.pool_size = pool_size
+
         if not self.version:
             self.success = False
             return
 
         if uri:
             if uri.startswith('magnet:') or uri.startswith('http:') or uri.startswith('https:'):
-                self.add(uri, title, poster)
-                self._wait_for_data()
+                try:
+                    self.add(uri, title, poster)
+                    self.wait_result = self._wait_for_data()
+                except requests.ConnectionError as e:
+                    # the version probe is cached, the server may have gone since
+                    self.log(e)
+                    self.success = False
                 return
 
             if uri.startswith('file:'):
                 path = url2path(uri)
 
         if path and not data:
-            with open(path, 'rb') as f:
-                data = f.read()
+            # mapped on demand, the upload streams from it and parsing reads the same pages
+            self._data_path = path
+            self._data = data = map_file(path)
 
         if data:
             name = path or 'Torrserver engine'
-            self.upload(name, data)
-            self._wait_for_data()
+            try:
+                self.upload(name, data)
+                if self._data_path:
+                    # the file may be overwritten or deleted before its items are read
+                    self._keep_torrent(data)
+                self.wait_result = self._wait_for_data()
+            except requests.ConnectionError as e:
+                self.log(e)
+                self.success = False
+            finally:
+                self.release_data()
+
+    @property
+    def data(self):
+        """ torrent file contents: bytes, or an mmap of a local .torrent mapped on first use """
+        if self._data is None and self._data_path:
+            self._data = self._remap()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        if value is self._data and value is not None:
+            return
+        self.release_data()
+        self._data = value
+        self._data_path = None
+
+    def _keep_torrent(self, data):
+        """ stores the uploaded torrent in the metadata cache, where _remap finds it
+            by hash. Without a cache the bytes are kept in memory, as before mapping.
+        """
+        cache = self.metadata_cache
+        if cache and self.hash:
+            from .bencodepy import BencodeDecodeError
+            try:
+                if not cache.has(self.hash):
+                    cache.put(data)
+                return
+            except (EnvironmentError, BencodeDecodeError) as e:
+                self.log(e)
+
+        self.data = data[:]
+
+    def _remap(self):
+        """ maps the local .torrent again if it still holds the uploaded torrent,
+            otherwise returns the copy kept by _keep_torrent (or None)
+        """
+        from .bencodepy import infohash, BencodeDecodeError
+
+        path, self._data_path = self._data_path, None
+        try:
+            data = map_file(path)
+        except EnvironmentError as e:
+            self.log(e)
+            data = None
+
+        if data is not None:
+            if not self.hash:
+                self._data_path = path
+                return data
+            try:
+                same = infohash(data) == self.hash.lower()
+            except BencodeDecodeError:
+                same = False
+            if same:
+                self._data_path = path
+                return data
+            # plugins reuse one temp file, it may hold another torrent by now
+            self.log('{0} was changed after the upload'.format(path))
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+        cache = self.metadata_cache
+        if cache and self.hash:
+            try:
+                return cache.get(self.hash)
+            except EnvironmentError as e:
+                self.log(e)
+        return None
+
+    def release_data(self):
+        """ unmaps a local .torrent, it is mapped again from its path when needed """
+        if isinstance(self._data, mmap.mmap):
+            try:
+                self._data.close()
+            except BufferError:
+                # still referenced through a memoryview, keep it
+                return
+            self._data = None
 
     @property
     def playable_items(self):
@@ -378,6 +832,17 @@ class Engine(BaseEngine):
         if self._playable_items:
             return self._playable_items
 
+        cache = self.metadata_cache
+        if cache and self.hash:
+            try:
+                items = cache.get_items(self.hash)
+            except EnvironmentError as e:
+                self.log(e)
+                items = None
+            if items:
+                self._playable_items = FileTable.from_items(items)
+                return self._playable_items
+
         if not self.data:
             st = self.stat()
             if 'RealIdFileStats' not in st:
@@ -385,19 +850,22 @@ class Engine(BaseEngine):
             if st.get('RealIdFileStats') is None:
                 raise NotImplementedError('RealIdFileStats is disabled in TorrServer 1.1.77_6, please enable it')
             for i in st['RealIdFileStats']: #it only torrserver 1.1.77_6 with RealIdFileStats and &ind=
-                self._playable_items.append({'index': i['Id'], 'name': i['Path'], 'size': i['Length']})
+                self._playable_items.append(i['Id'], i['Path'], i['Length'])
             return self._playable_items
 
+        from . import bencodepy
         if version_info >= (3, 0):
-            from .bencodepy import bdecode
             def _(name):
                 return name.encode('ascii', 'ignore')
         else:
-            from .bencode import bdecode
             def _(name):
                 return name
 
-        decoded = bdecode(self.data)
+        data = self.data
+        if isinstance(data, mmap.mmap) and bencodepy.backend != 'python':
+            # the accelerated backend only takes bytes, the python decoder reads the mapping itself
+            data = data[:]
+        decoded = bencodepy.bdecode(data)
 
         info = decoded[_('info')]
 
@@ -413,38 +881,37 @@ class Engine(BaseEngine):
             else:
                 return f[_('path')]
 
-        def _name(name):
-            import sys
-            try:
-                if sys.version_info < (3, 0) and isinstance(name, str):
-                    return name.decode('utf-8')
-                if sys.version_info >= (3, 0) and isinstance(name, bytes):
-                    return name.decode('utf-8')
-            except UnicodeDecodeError:
-                import chardet      # type: ignore
-                enc = chardet.detect(name)
-                if enc['confidence'] > 0.5:
-                    try:
-                        name = name.decode(enc['encoding'])
-                    except UnicodeDecodeError:
-                        pass
-            return name
-
-        info_name = _name(info_name())
+        raw_name = info_name()
         try:
             if _('files') in info:
-                for i, f in enumerate(info[_('files')]):
-                    name = _name('/'.join(f_path(f)))
-                    name = u'/'.join([info_name, name])
-                    size = f['length']
-
-                    self._playable_items.append({'index': i, 'name': name, 'size': size})
+                files = info[_('files')]
+                raw = [_('/').join(f_path(f)) for f in files]
+                # one codec for the whole torrent, the name is part of the sample
+                names = decode_names([raw_name] + raw, self.hash)
+                root = names[0]
+                for i, f in enumerate(files):
+                    name = u'/'.join([root, names[i + 1]])
+                    size = f[_('length')]
+
+                    self._playable_items.append(i, name, size)
             else:
-                self._playable_items = [ {'index': 0, 'name': info_name, 'size': info[_('length')] } ]
+                name = decode_names([raw_name], self.hash)[0]
+                self._playable_items = FileTable()
+                self._playable_items.append(0, name, info[_('length')])
         except UnicodeDecodeError:
             return None
         except BaseException as e:
             pass
+        else:
+            # a table cut short by an error above is not worth keeping
+            if cache and self.hash and self._playable_items:
+                try:
+                    cache.put_items(self.hash, self._playable_items.to_list())
+                except EnvironmentError as e:
+                    self.log(e)
+        finally:
+            if self._data_path:
+                self.release_data()
 
         return self._playable_items
 
@@ -503,66 +970,140 @@ class Engine(BaseEngine):
 
     def upload(self, name, data):
         self.data = data
+
+        from .bencodepy import infohash, BencodeDecodeError
+        try:
+            hash = infohash(data)
+        except BencodeDecodeError:
+            hash = None
+
+        # the server already has it, skip sending the file again
+        if hash and self._on_server(hash):
+            self.hash = hash
+            self.log('Engine upload: {0} already on server'.format(hash))
+            return True
+
         return BaseEngine.upload(self, name, data)
 
+    def _on_server(self, hash):
+        try:
+            return bool(self.stats([hash]))
+        except (ValueError, TypeError, KeyError) as e:
+            # an error page or a list answer of unexpected shape, just upload
+            self.log(e)
+            return False
+
     def add(self, uri, title=None, poster=None, data=None):
         if uri.startswith('magnet:'):
             pass  # self.data = self._magnet2data(uri)
         else:
-            r = requests.get(uri, auth=self.auth)
-            if r.status_code == requests.codes.ok:
-                self.data = r.content
+            self.data = self._fetch_torrent(uri)
 
         return BaseEngine.add(self, uri, title=title, poster=poster)
 
-    def start_preload(self, url):
-        def download_stream():
-            req = requests.get(url, stream=True, allow_redirects=False, auth=self.auth)
-            for chunk in req.iter_content(chunk_size=128):
-                self.log('dowload chunk: 128')
+    def _is_server_url(self, uri):
+        u = urlparse(uri)
+        try:
+            port = u.port or (443 if u.scheme == 'https' else 80)
+        except ValueError:
+            return False
+        return u.hostname == self.host and port == int(self.port)
 
-        import threading
-        t = threading.Thread(target=download_stream)
-        t.start()
+    def _fetch_torrent(self, uri):
+        cache = self.metadata_cache
+        if cache:
+            try:
+                cached = cache.get_by_url(uri)
+            except EnvironmentError as e:
+                self.log(e)
+                cached = None
+            if cached:
+                self.log('torrent from cache: {0}'.format(cached[0]))
+                return cached[1]
 
-    def id_to_files_index(self, file_id):
-        ts = self.torrent_stat()
+        if self._is_server_url(uri):
+            r = self.session.get(uri)
+        else:
+            # a tracker or some other site: no server credentials, cookies or pooled connection
+            r = requests.get(uri)
+        if r.status_code != requests.codes.ok:
+            return None
+
+        if cache:
+            from .bencodepy import BencodeDecodeError
+            try:
+                cache.put(r.content, uri)
+            except (EnvironmentError, BencodeDecodeError) as e:
+                self.log(e)
+
+        return r.content
 
+    def start_preload(self, url, index=None):
+        key = (self.host, self.port, self.hash, index) if index is not None else url
+        self.preloader = Preloader.start_for(self.session, url, key,
+                                             chunk_size=self.preload_chunk_size,
+                                             budget=self.preload_budget,
+                                             log=self.log)
+        return self.preloader
+
+    def close(self):
+        if self.preloader:
+            self.preloader.cancel()
+        self.data = None
+        BaseEngine.close(self)
+
+    def invalidate_cache(self):
+        self._file_index = None
+        self._file_table = None
+        m3u_key = (self.host, self.port, self.hash)
+        Engine.m3u_cache.invalidate(lambda key: key == m3u_key)
+        BaseEngine.invalidate_cache(self)
+
+    def file_index(self, torrent_stat=None):
+        """ FileIndex of the torrent, built once the server knows its file list """
+        fi = self._file_index
+        if fi is not None and fi.hash == self.hash:
+            return fi
+
+        if not torrent_stat:
+            torrent_stat = self.torrent_stat()
+
+        id_key = 'id' if self.is_v2 else 'Id'
+        fi = FileIndex(self.hash, [(f['file_id'], f['path'], f['id'])
+                                   for f in iter_files(torrent_stat, self.is_v2, id_key)])
+        if len(fi):
+            self._file_index = fi
+        return fi
+
+    def id_to_files_index(self, file_id):
         try:
             pi = self._get_playable_items()[file_id]
         except:
             return file_id
 
-        files_index = 0
-        for fl in ts['Files']:
-            self.log(_u(fl['Name']))
-            if pi['name'] == fl['Name']:
-                return files_index
-            files_index += 1
-
-        return file_id
+        files_index = self.file_index().by_path.get(pi['name'])
+        return file_id if files_index is None else files_index
 
     def _start_v2(self, start_index=None):
         preload_url = self.make_url("/stream?link={}&index={}&preload".format(
             self.hash, start_index+1
         ))
 
-        self.start_preload(preload_url)
+        self.start_preload(preload_url, start_index)
 
     def _start_v1(self, start_index=None):
         for n in range(5):
             self.log('Try # {0}'.format(n))
             try:
-                files = self.list()
-                self.log(_u(files))
+                torrent = self._torrent_stat_v1()
+                self.log(_u(torrent))
 
-                for torrent in files:
-                    if self.hash == torrent['Hash']:
-                        file = torrent['Files'][start_index]
-                        preload = file['Preload']
+                if torrent:
+                    file = torrent['Files'][start_index]
+                    preload = file['Preload']
 
-                        self.start_preload(self.make_url(preload))
-                        return
+                    self.start_preload(self.make_url(preload), start_index)
+                    return
                 break
             except BaseException as e:
                 self.log(e)
@@ -583,11 +1124,8 @@ class Engine(BaseEngine):
             self._start_v1(start_index)
 
     def _torrent_stat_v1(self):
-        lst = self.list()
-
-        for torr in lst:
-            if self.hash == torr['Hash']:
-                return torr
+        self.refresh_registry()
+        return self.registry.get(self.hash)
 
     def torrent_stat(self):
         if self.is_v2:
@@ -600,53 +1138,56 @@ class Engine(BaseEngine):
             torrent_stat = self.torrent_stat()
         return torrent_stat['Files'][index]
 
-    def files(self, torrent_stat=None):
+    def file_table(self, torrent_stat=None):
+        """ FileTable of {'file_id', 'path', 'size'} rows, kept once the server knows the file list """
+        cached = self._file_table
+        if cached is not None and cached[0] == self.hash:
+            return cached[1]
+
         if not torrent_stat:
             torrent_stat = self.torrent_stat()
-        id = 0
-        for f in torrent_stat['Files']:
-            yield { 'file_id': id, 
-                    'path': f['path'] if self.is_v2 else f['Name'],
-                    'size': f['length'] if self.is_v2 else f['Size'],
-                    #'viewed': f['viewed'] if self.is_v2 else f['Viewed']
-            }
-            id += 1
+
+        table = FileTable(keys=('file_id', 'path', 'size'))
+        for f in iter_files(torrent_stat, self.is_v2):
+            table.append(f['file_id'], f['path'], f['size'])
+        if len(table):
+            self._file_table = (self.hash, table)
+        return table
+
+    def files(self, torrent_stat=None):
+        return iter(self.file_table(torrent_stat))
 
     def get_ts_index(self, name):
-        def name_in_path(name, path):
-            if '/' in name and '/' in path:
-                return name == path
-            else:
-                return name.split('/')[-1] == path.split('/')[-1]
+        return self.file_index().find(name)
+
+    def m3u_urls(self):
+        """ {file index: play url} from the server playlist, or None if it is not available """
+        key = (self.host, self.port, self.hash)
+        urls = Engine.m3u_cache.get(key)
+        if urls is not None:
+            return urls
+
+        def fetch():
+            r = self.session.get(self.make_url("/stream/?link={}&m3u".format(self.hash)))
+            if r.status_code != requests.codes.ok:
+                return None
+            urls = parse_m3u(r.text)
+            Engine.m3u_cache.put(key, urls)
+            return urls
 
-        for f in self.files():
-            if name_in_path(name, f['path']):
-                return f['file_id']
+        return Engine.m3u_in_flight.do(key, fetch)
 
     def play_url(self, index, torrent_stat=None):
         fs = self.file_stat(index, torrent_stat)
 
         if self.is_v2:
-            cache = Engine.m3u_cache
-            hash = self.hash
-            if hash in cache:
-                m3u = cache[hash]
-            else:
-                r = requests.get(self.make_url("/stream/?link={}&m3u".format(hash)), auth=self.auth)
-                if r.status_code == requests.codes.ok:
-                    m3u = r.text
-                    cache[hash] = m3u                   
-
-            if hash in cache:
-                for line in m3u.splitlines():
-                    if line.startswith('http://'):
-                        find_str = "&index={}&".format( fs['id'] )
-                        if find_str in line:
-                            return line
+            urls = self.m3u_urls()
+            if urls is not None:
+                return urls.get(fs['id'])
             else:
                 quoted_path = encode_url(fs['path'])
                 return self.make_url("/stream/{}?link={}&index={}&play".format(
-                                                quoted_path, hash, index+1))
+                                                quoted_path, self.hash, index+1))
 
         return self.make_url(fs['Link'])
 
@@ -659,63 +1200,25 @@ class Engine(BaseEngine):
 
         self.log(_u(st))
 
-        stat_id = st.get('TorrentStatus')
+        return calc_buffer_progress(st, self.is_v2)
 
-        # Fix zero preload size
-        if self.is_v2:
-            if stat_id > 2:
-                return 100
-            elif stat_id < 2:
-                return 0
-
-        preloadedBytes = st.get('PreloadedBytes', 0)
-        preloadSize = st.get('PreloadSize', 0)
-        if preloadSize > 0 and preloadedBytes > 0:
-            prc = preloadedBytes * 100 / preloadSize
-            if prc >= 100:
-                prc = 100
-
-            if prc > 0 and stat_id != 2: # 2 - 'Torrent preload'
-                prc = 100
-            return prc
-
-        return 0
+    def snapshot(self, torrent_stat=None):
+        """ returns TorrentSnapshot of one torrent stat request """
+        if not torrent_stat:
+            torrent_stat = self.torrent_stat()
+        return TorrentSnapshot(torrent_stat, self.is_v2)
 
     @property
     def title(self):
-        if self.is_v2:
-            return self.stat().get('title')
-        else:
-            ts = self.torrent_stat()
-            info = ts.get('Info')
-            if info:
-                info = json.loads(info)
-                if info:
-                    return info.get('title')
+        return self.snapshot().title
 
     @property
     def poster(self):
-        if self.is_v2:
-            return self.stat().get('poster')
-        else:
-            ts = self.torrent_stat()
-            info = ts.get('Info')
-            if info:
-                info = json.loads(info)
-                if info:
-                    return info.get('poster_path')
+        return self.snapshot().poster
 
     @property
     def fanart(self):
-        if self.is_v2:
-            return None # self.stat().get('fanart')
-        else:
-            ts = self.torrent_stat()
-            info = ts.get('Info')
-            if info:
-                info = json.loads(info)
-                if info:
-                    return info.get('backdrop_path')
+        return self.snapshot().fanart
 
     @staticmethod
     def extract_hash_from_magnet(magnet):
@@ -750,79 +1253,16 @@ class Engine(BaseEngine):
             return unquote_plus(m.group(1))
 
 
-    def get_art(self):
+    def get_art(self, snapshot=None):
         """ returns art """
-        art = {}
-
-        poster = self.poster
-        if poster:
-            art = {
-                'thumb': poster,
-                'poster': poster,
-            }
-
-        fanart = self.fanart
-        if fanart:
-            art['fanart'] = fanart
-
-        return art
-
-    def _get_video_info_v1(self):
-        ts = self.torrent_stat()
-        data = ts.get('Info')
-        info = self._get_video_info_from_data(data)
-        return info if info else {}
-
-    def _get_video_info_v2(self):
-        ts = self.stat()
-        data = ts.get('data', {})
-        info = self._get_video_info_from_data(data)
-        return info if info else {'title': self.title}
+        return (snapshot or self.snapshot()).art
 
     def _get_video_info_from_data(self, data):
-        info = json.loads(data) if data else None
-        if not info:
-            return {}
-
-        video_info = {'data': data}
-        if 'title' in info:
-            video_info = {'title': info['title']}
-        if 'overview' in info:
-            video_info['plot'] = info.get('overview', '')
-        if 'year' in info:
-            video_info['year'] = int(info.get('year'))
-        if 'genres' in info:
-            genres = []
-            for g in info['genres']:
-                genres.append(g['name'])
-            if genres: 
-                video_info['genre'] = genres
-        if 'original_title' in info:
-            video_info['originaltitle'] = info.get('original_title')
-        if 'vote_average' in info:
-            video_info['rating'] = info.get('vote_average', 0.0)
-        if 'origin_country' in info:
-            country = ''
-            for g in info.get('origin_country'):
-                country += g + ', '
-            if country: video_info['studio'] = country.strip(' ,')
-        if 'runtime' in info:
-            video_info['duration'] = info.get('runtime', 0) / 1000
-        if 'imdb_id' in info:
-            video_info['imdbnumber'] = info.get('imdb_id')
-        if "media_type" in info:
-            video_info['mediatype'] = info.get('media_type', '')
-        if "seasons" in info and not video_info.get('mediatype'):
-            video_info['mediatype'] = 'tvshow'
-
-        return video_info
-
-    def get_video_info(self):
+        return video_info_from_data(data)
+
+    def get_video_info(self, snapshot=None):
         """ returns video info """
-        if self.is_v2:
-            return self._get_video_info_v2()
-        else:
-            return self._get_video_info_v1()
+        return (snapshot or self.snapshot()).video_info
 
 
 
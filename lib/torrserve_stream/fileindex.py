@@ -0,0 +1,42 @@
+# coding: utf-8
+
+
+class FileIndex(object):
+    """ Maps full path, basename and server file id to the TorrServer file index """
+
+    __slots__ = ['hash', 'by_path', 'by_basename', 'by_id']
+
+    def __init__(self, hash, files):
+        """ files are (file index, path, server file id or None) tuples in TorrServer order """
+        self.hash = hash
+        self.by_path = {}
+        self.by_basename = {}
+        self.by_id = {}
+
+        for index, path, file_id in files:
+            self.by_path.setdefault(path, index)
+            self.by_basename.setdefault(path.split('/')[-1], index)
+            if file_id is not None:
+                self.by_id.setdefault(file_id, index)
+
+    def __len__(self):
+        return len(self.by_path)
+
+    def find(self, name):
+        """ same matching as a linear scan: full paths compare as a whole, anything else by basename """
+        if '/' not in name:
+            return self.by_basename.get(name)
+
+        candidates = []
+
+        index = self.by_path.get(name)
+        if index is not None:
+            candidates.append(index)
+
+        # a flat path in the torrent matches by basename only
+        basename = name.split('/')[-1]
+        index = self.by_path.get(basename)
+        if index is not None:
+            candidates.append(index)
+
+        return min(candidates) if candidates else None
@@ -0,0 +1,151 @@
+# coding: utf-8
+
+from array import array
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+try:
+    from sys import intern
+except ImportError:
+    pass    # python 2 builtin
+
+try:
+    array('q')
+    _SIZE_TYPE = 'q'
+except ValueError:
+    # python 2 has no 64 bit integer arrays, doubles are exact up to 2**53
+    _SIZE_TYPE = 'd'
+
+
+class FileItem(Mapping):
+    """ Read-only mapping view of one row of a FileTable
+
+        Rows can not be changed through it. It is not a dict: json.dumps and
+        isinstance(item, dict) need to_dict() (or FileTable.to_list()).
+    """
+
+    __slots__ = ['_table', '_row']
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._table.value(self._row, key)
+
+    def get(self, key, def_val=None):
+        try:
+            return self._table.value(self._row, key)
+        except KeyError:
+            return def_val
+
+    def __contains__(self, key):
+        return key in self._table.keys
+
+    def __iter__(self):
+        return iter(self._table.keys)
+
+    def __len__(self):
+        return len(self._table.keys)
+
+    def keys(self):
+        return list(self._table.keys)
+
+    def items(self):
+        return [(key, self[key]) for key in self._table.keys]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            other = dict(other.items())
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class FileTable(object):
+    """ Compact table of (index, path, size) rows
+
+        Indices and sizes live in typed arrays, directories are stored once
+        and shared by their files. Rows read as FileItem views, so callers
+        written for lists of {'index', 'name', 'size'} dicts keep working.
+    """
+
+    __slots__ = ['keys', '_indices', '_sizes', '_dir_ids', '_names', '_dirs', '_dir_map']
+
+    def __init__(self, keys=('index', 'name', 'size')):
+        self.keys = keys
+        self._indices = array('l')
+        self._sizes = array(_SIZE_TYPE)
+        self._dir_ids = array('l')
+        self._names = []
+        self._dirs = [u'']
+        self._dir_map = {u'': 0}
+
+    @classmethod
+    def from_items(cls, items, keys=('index', 'name', 'size')):
+        table = cls(keys)
+        index_key, name_key, size_key = keys
+        for item in items:
+            table.append(item[index_key], item[name_key], item[size_key])
+        return table
+
+    def append(self, index, name, size):
+        dir, _, base = name.rpartition(u'/')
+
+        dir_id = self._dir_map.get(dir)
+        if dir_id is None:
+            dir_id = self._dir_map[dir] = len(self._dirs)
+            self._dirs.append(dir)
+
+        self._indices.append(index)
+        self._sizes.append(size)
+        self._dir_ids.append(dir_id)
+        self._names.append(intern(base) if isinstance(base, str) else base)
+
+    def value(self, row, key):
+        index_key, name_key, size_key = self.keys
+        if key == index_key:
+            return self._indices[row]
+        if key == size_key:
+            return int(self._sizes[row])
+        if key == name_key:
+            return self.name(row)
+        raise KeyError(key)
+
+    def name(self, row):
+        dir = self._dirs[self._dir_ids[row]]
+        base = self._names[row]
+        return dir + u'/' + base if dir else base
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [FileItem(self, r) for r in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('file table index out of range')
+        return FileItem(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield FileItem(self, row)
+
+    def to_list(self):
+        """ rows as plain dicts, e.g. for json """
+        return [item.to_dict() for item in self]
+
+    def __repr__(self):
+        return repr(self.to_list())
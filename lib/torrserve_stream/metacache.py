@@ -0,0 +1,170 @@
+# coding: utf-8
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def default_cache_dir():
+    try:
+        import xbmcvfs     # type: ignore
+        translate = getattr(xbmcvfs, 'translatePath', None)
+        if translate is None:
+            import xbmc    # type: ignore
+            translate = xbmc.translatePath
+        return os.path.join(translate('special://temp'), 'torrserver')
+    except ImportError:
+        return os.path.join(tempfile.gettempdir(), 'torrserver')
+
+
+def _replace(src, dst):
+    try:
+        os.replace(src, dst)
+    except AttributeError:
+        # python 2, rename does not overwrite on Windows
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+class TorrentCache(object):
+    """ On-disk cache of .torrent bytes and decoded file tables keyed by info hash
+
+        Source urls are mapped to hashes for url_ttl seconds (trackers update
+        torrents of running series in place). The directory is kept below
+        max_size bytes by removing the least recently used torrents.
+    """
+
+    def __init__(self, path=None, max_size=64 * 1024 * 1024, url_ttl=6 * 3600):
+        self.path = path
+        self.max_size = max_size
+        self.url_ttl = url_ttl
+        self._lock = threading.Lock()
+
+    def _dir(self):
+        if self.path is None:
+            self.path = default_cache_dir()
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        return self.path
+
+    def _file(self, hash, ext):
+        return os.path.join(self._dir(), hash.lower() + ext)
+
+    def _write(self, filename, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            _replace(tmp, filename)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _read(self, filename):
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        try:
+            os.utime(filename, None)    # mark as recently used
+        except OSError:
+            pass
+        return data
+
+    def _load_urls(self):
+        data = self._read(os.path.join(self._dir(), 'urls.idx'))
+        try:
+            return json.loads(data.decode('utf-8')) if data else {}
+        except ValueError:
+            return {}
+
+    def _save_urls(self, urls):
+        self._write(os.path.join(self._dir(), 'urls.idx'), json.dumps(urls).encode('utf-8'))
+
+    def get(self, hash):
+        """ returns cached .torrent bytes or None """
+        with self._lock:
+            return self._read(self._file(hash, '.torrent'))
+
+    def has(self, hash):
+        with self._lock:
+            return os.path.exists(self._file(hash, '.torrent'))
+
+    def get_by_url(self, url):
+        """ returns (hash, .torrent bytes) cached for url or None """
+        with self._lock:
+            entry = self._load_urls().get(url)
+            if not entry or entry[1] + self.url_ttl < time.time():
+                return None
+            data = self._read(self._file(entry[0], '.torrent'))
+            return (entry[0], data) if data else None
+
+    def put(self, data, url=None):
+        """ stores .torrent bytes, returns their info hash """
+        from .bencodepy import infohash
+        hash = infohash(data)
+
+        with self._lock:
+            self._write(self._file(hash, '.torrent'), bytes(data))
+            if url:
+                urls = self._load_urls()
+                urls[url] = (hash, time.time())
+                self._save_urls(urls)
+            self._evict()
+
+        return hash
+
+    def get_items(self, hash):
+        """ returns the cached decoded file table of a torrent or None """
+        with self._lock:
+            data = self._read(self._file(hash, '.json'))
+        try:
+            return json.loads(data.decode('utf-8')) if data else None
+        except ValueError:
+            return None
+
+    def put_items(self, hash, items):
+        with self._lock:
+            self._write(self._file(hash, '.json'), json.dumps(items).encode('utf-8'))
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self._dir()):
+                os.remove(os.path.join(self.path, name))
+
+    def _evict(self):
+        entries = {}
+        total = 0
+        for name in os.listdir(self.path):
+            hash, ext = os.path.splitext(name)
+            if ext not in ('.torrent', '.json'):
+                continue
+            st = os.stat(os.path.join(self.path, name))
+            size, used = entries.get(hash, (0, 0))
+            entries[hash] = (size + st.st_size, max(used, st.st_mtime))
+            total += st.st_size
+
+        if total <= self.max_size:
+            return
+
+        evicted = set()
+        for hash, (size, used) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.max_size:
+                break
+            for ext in ('.torrent', '.json'):
+                filename = os.path.join(self.path, hash + ext)
+                if os.path.exists(filename):
+                    os.remove(filename)
+            evicted.add(hash)
+            total -= size
+
+        urls = self._load_urls()
+        kept = {url: entry for url, entry in urls.items() if entry[0] not in evicted}
+        if len(kept) != len(urls):
+            self._save_urls(kept)
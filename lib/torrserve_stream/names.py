@@ -0,0 +1,96 @@
+# coding: utf-8
+
+from .cache import TTLCache
+
+# codec chosen per info hash, None means no confident guess
+encodings = TTLCache(maxsize=256, ttl=24 * 3600)
+
+_chardet = None
+
+
+def _detector():
+    """ chardet is slow to import, so it is loaded on the first non-UTF-8 torrent only """
+    global _chardet
+    if _chardet is None:
+        try:
+            import chardet      # type: ignore
+            _chardet = chardet
+        except ImportError:
+            _chardet = False
+    return _chardet
+
+
+def _is_raw(name):
+    return isinstance(name, (bytes, bytearray))
+
+
+def _utf8(name):
+    try:
+        return name.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def detect_encoding(names, sample_size=16 * 1024, min_confidence=0.25):
+    """ guesses one codec for a sample of names that are not UTF-8, returns None if unsure """
+    chardet = _detector()
+    if not chardet:
+        return None
+
+    sample = []
+    size = 0
+    for name in names:
+        sample.append(bytes(name))
+        size += len(name) + 1
+        if size >= sample_size:
+            break
+
+    if not sample:
+        return None
+
+    sample = b'\n'.join(sample)
+    enc = chardet.detect(sample)
+    codec = enc.get('encoding')
+    confidence = enc.get('confidence') or 0
+    if not codec or confidence <= min_confidence:
+        return None
+    if confidence > 0.5:
+        return codec
+
+    # short, repetitive file names rarely score high; a guess that decodes
+    # the whole sample cleanly is good enough
+    try:
+        sample.decode(codec)
+        return codec
+    except (UnicodeDecodeError, LookupError):
+        return None
+
+
+def decode_names(names, hash=None):
+    """ decodes raw torrent names, UTF-8 first and one detected codec for the rest
+
+        The codec is detected once per torrent and remembered by info hash.
+        Names that can not be decoded are returned as they are.
+    """
+    decoded = [_utf8(name) if _is_raw(name) else name for name in names]
+    failed = [i for i, name in enumerate(decoded) if name is None]
+    if not failed:
+        return decoded
+
+    key = hash.lower() if hash else None
+    codec = encodings.get(key, False) if key else False
+    if codec is False:
+        codec = detect_encoding(names[i] for i in failed)
+        if key:
+            encodings.put(key, codec)
+
+    for i in failed:
+        name = names[i]
+        if codec:
+            try:
+                name = name.decode(codec)
+            except (UnicodeDecodeError, LookupError):
+                pass
+        decoded[i] = name
+
+    return decoded
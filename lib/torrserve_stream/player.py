@@ -90,6 +90,7 @@ class Player(xbmc.Player):
                 dialog = xbmcgui.Dialog()
                 dialog.notification('TorrServer', 'Server not started. Please start server or reconfigure settings',
                                     xbmcgui.NOTIFICATION_INFO, 5000)
+                self.engine.close()
                 return
 
             ts = self.engine.torrent_stat()
@@ -121,6 +122,8 @@ class Player(xbmc.Player):
                 _log("Remove from DB")
                 self.engine.rem()
 
+            self.engine.close()
+
         except BaseException as e:
             _log('************************ ERROR ***********************')
             _log(e)
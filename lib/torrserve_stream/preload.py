@@ -0,0 +1,104 @@
+# coding: utf-8
+
+import threading
+import time
+
+
+class Preloader(object):
+    """ Reads a preload stream in a background thread and throws the data away
+
+        At most one preloader runs per key (normally host, port, hash and file
+        index), reading stops after budget bytes or on cancel().
+    """
+
+    active = {}
+    active_lock = threading.Lock()
+
+    def __init__(self, session, url, key=None, chunk_size=256 * 1024, budget=None, log=None):
+        self.session = session
+        self.url = url
+        self.key = key if key is not None else url
+        self.chunk_size = chunk_size
+        self.budget = budget
+        self.log = log or (lambda s: None)
+        self.bytes_read = 0
+        self.started = None
+        self.finished = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._response = None
+        self._thread = None
+
+    @classmethod
+    def start_for(cls, session, url, key=None, **kwargs):
+        """ returns the running preloader for key, or starts a new one """
+        preloader = cls(session, url, key, **kwargs)
+        with cls.active_lock:
+            running = cls.active.get(preloader.key)
+            if running is not None and running.running:
+                return running
+            cls.active[preloader.key] = preloader
+
+        preloader.start()
+        return preloader
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._done.is_set()
+
+    @property
+    def rate(self):
+        """ bytes/sec since start """
+        if not self.started:
+            return 0
+        elapsed = (self.finished or time.time()) - self.started
+        return self.bytes_read / elapsed if elapsed > 0 else 0
+
+    def progress(self):
+        return {'bytes': self.bytes_read, 'budget': self.budget, 'rate': self.rate, 'running': self.running}
+
+    def cancel(self):
+        self._cancel.set()
+        response = self._response
+        if response is not None:
+            # unblocks a read waiting on the socket
+            response.close()
+
+    def join(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _run(self):
+        try:
+            response = self.session.get(self.url, stream=True, allow_redirects=False)
+            self._response = response
+            try:
+                chunk_size = self.chunk_size
+                if self.budget:
+                    chunk_size = min(chunk_size, self.budget)
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    self.bytes_read += len(chunk)
+                    if self._cancel.is_set():
+                        break
+                    if self.budget is not None and self.bytes_read >= self.budget:
+                        break
+            finally:
+                response.close()
+        except BaseException as e:
+            if not self._cancel.is_set():
+                self.error = e
+                self.log(e)
+        finally:
+            self.finished = time.time()
+            self._done.set()
+            with Preloader.active_lock:
+                if Preloader.active.get(self.key) is self:
+                    del Preloader.active[self.key]
+
+        self.log('preload finished: {0} bytes, {1} bytes/sec'.format(self.bytes_read, int(self.rate)))
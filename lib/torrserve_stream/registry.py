@@ -0,0 +1,87 @@
+# coding: utf-8
+
+import threading
+
+
+class TorrentDelta(object):
+    __slots__ = ['added', 'removed', 'changed']
+
+    def __init__(self, added, removed, changed):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return 'TorrentDelta(added={0}, removed={1}, changed={2})'.format(
+            self.added, self.removed, self.changed)
+
+
+class TorrentRegistry(object):
+    """ Last known torrent list of a server, indexed by hash
+
+        update() takes a fresh list() result, returns what was added, removed or
+        changed since the previous one and passes the delta to subscribers.
+    """
+
+    def __init__(self, key='Hash', wrap=None):
+        self.key = key
+        self.wrap = wrap
+        self._lock = threading.Lock()
+        self._torrents = {}
+        self._items = None
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._torrents)
+
+    def __contains__(self, hash):
+        return hash in self._torrents
+
+    def get(self, hash, def_val=None):
+        item = self._torrents.get(hash)
+        if item is None:
+            return def_val
+        return self.wrap(item) if self.wrap else item
+
+    def index(self):
+        torrents = self._torrents
+        if not self.wrap:
+            return dict(torrents)
+        return {h: self.wrap(item) for h, item in torrents.items()}
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._listeners.remove(callback)
+
+    def update(self, items):
+        if items is self._items:
+            # same (cached) list object as last time, nothing could have changed
+            return TorrentDelta([], [], [])
+
+        key = self.key
+        new = {item[key]: item for item in items}
+
+        with self._lock:
+            old = self._torrents
+            added = [h for h in new if h not in old]
+            removed = [h for h in old if h not in new]
+            changed = [h for h, item in new.items() if h in old and old[h] != item]
+            self._torrents = new
+            self._items = items
+            listeners = self._listeners[:]
+
+        delta = TorrentDelta(added, removed, changed)
+        if delta:
+            for callback in listeners:
+                callback(delta)
+
+        return delta
@@ -0,0 +1,86 @@
+# coding: utf-8
+
+import atexit
+import threading
+import requests     # type: ignore
+
+
+DEFAULT_POOL_SIZE = 4
+
+
+def normalize_auth(auth):
+    """ lists (e.g. from settings) become (user, password) tuples, AuthBase objects are kept """
+    return tuple(auth) if isinstance(auth, list) else auth
+
+
+def auth_key(auth):
+    auth = normalize_auth(auth)
+    if isinstance(auth, (requests.auth.HTTPBasicAuth, requests.auth.HTTPDigestAuth)):
+        # not hashable, and engines usually get a new one each: equal credentials share a session
+        return (type(auth), auth.username, auth.password)
+    try:
+        hash(auth)
+    except TypeError:
+        # other unhashable AuthBase objects: the pooled session keeps the object
+        # alive, so its id is not reused while the key exists
+        return (type(auth), id(auth))
+    return auth
+
+
+class SessionPool(object):
+    """ Shares keep-alive requests sessions between engines talking to the same server """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._refs = {}
+
+    @staticmethod
+    def make_key(host, port, auth=None):
+        return (host, int(port), auth_key(auth) if auth else None)
+
+    def _create(self, auth, pool_size):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if auth:
+            session.auth = normalize_auth(auth)
+        return session
+
+    def acquire(self, host, port, auth=None, pool_size=None):
+        key = self.make_key(host, port, auth)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._create(auth, pool_size or self.pool_size)
+                self._sessions[key] = session
+                self._refs[key] = 0
+            self._refs[key] += 1
+            return session
+
+    def release(self, host, port, auth=None):
+        key = self.make_key(host, port, auth)
+        with self._lock:
+            if key not in self._refs:
+                return
+            self._refs[key] -= 1
+            if self._refs[key] > 0:
+                return
+            session = self._sessions.pop(key)
+            del self._refs[key]
+        session.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._refs.clear()
+        for session in sessions:
+            session.close()
+
+
+pool = SessionPool()
+
+atexit.register(pool.close_all)
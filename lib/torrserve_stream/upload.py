@@ -0,0 +1,96 @@
+# coding: utf-8
+
+import mmap
+import os
+import sys
+import uuid
+
+
+def _text(s):
+    """ filenames may come as bytes (python 2 paths), the header is built in unicode """
+    if not isinstance(s, bytes):
+        return s
+    try:
+        return s.decode('utf-8')
+    except UnicodeDecodeError:
+        return s.decode(sys.getfilesystemencoding() or 'utf-8', 'replace')
+
+
+def map_file(path):
+    """ returns a read-only mmap of the file, or its bytes if it can not be mapped (e.g. empty) """
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error, EnvironmentError):
+            return f.read()
+
+
+class MultipartFile(object):
+    """ multipart/form-data body that reads the file part from source on demand
+
+        source is an open binary file or an mmap, read from its current
+        position. requests sends it with a Content-Length and never holds
+        more than one block of the file in memory.
+    """
+
+    def __init__(self, source, filename, fields=None, field_name='file', chunk_size=64 * 1024):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self._source = source
+
+        head = []
+        for name, value in (fields or {}).items():
+            head.append(u'--{0}\r\nContent-Disposition: form-data; name="{1}"\r\n\r\n{2}\r\n'.format(
+                self.boundary, name, value))
+        head.append(u'--{0}\r\nContent-Disposition: form-data; name="{1}"; filename="{2}"\r\n'
+                    u'Content-Type: application/octet-stream\r\n\r\n'.format(
+                        self.boundary, field_name, _text(filename).replace(u'"', u'')))
+
+        self._head = u''.join(head).encode('utf-8')
+        self._tail = '\r\n--{0}--\r\n'.format(self.boundary).encode('utf-8')
+
+        if isinstance(source, mmap.mmap):
+            self._file_size = len(source) - source.tell()
+        else:
+            self._file_size = os.fstat(source.fileno()).st_size - source.tell()
+
+        self._file_left = self._file_size
+        # None stands for the file contents
+        self._queue = [self._head, None, self._tail]
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=' + self.boundary
+
+    def __len__(self):
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(self.chunk_size), b''))
+
+        queue = self._queue
+        while queue:
+            part = queue[0]
+
+            if part is None:
+                if self._file_left <= 0:
+                    queue.pop(0)
+                    continue
+                chunk = self._source.read(min(size, self._file_left))
+                if not chunk:
+                    raise IOError('file shrank during upload')
+                self._file_left -= len(chunk)
+                return chunk
+
+            if len(part) > size:
+                queue[0] = part[size:]
+                return part[:size]
+
+            queue.pop(0)
+            return part
+
+        return b''
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.chunk_size), b'')